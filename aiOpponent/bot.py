@@ -1,40 +1,73 @@
-from library.constants import WELCOME_MESSAGE
-from aiOpponent.botSettings import SERVER_IP, SERVER_PORT
-from typing import Dict, Tuple
+from aiOpponent.botSettings import SERVER_IP, SERVER_PORT, RECONNECT_AFTER_S
+from typing import Tuple
 import socket
-import json
-import pygame.time
+
+import library.clock
+import library.profiling
+import library.protocol
 
 class Bot:
     connection: socket.socket
-    clock: pygame.time.Clock
+    clock: library.clock.Clock
     player_location: int
     ball_location: Tuple[float, float]
+    profiler: library.profiling.TickProfiler
+    # Reassembles snapshots sent as deltas
+    snapshots: library.protocol.SnapshotReceiver
+    # Room the server put the bot in, learned from its first message
+    room_id: int
+    # Token of the bot's session, 0 until the server welcomes it
+    token: int
+    # Numbers the inputs and repeats the last ones in every message
+    inputs: library.protocol.InputSender
 
     def __init__(self):
         self.connection = socket.socket(
             socket.AF_INET,
             socket.SOCK_DGRAM
         )
-        self.connection.bind((SERVER_IP, SERVER_PORT))
+        self.connection.settimeout(RECONNECT_AFTER_S)
+        self.clock = library.clock.Clock()
+        self.profiler = library.profiling.TickProfiler('bot')
+        self.snapshots = library.protocol.SnapshotReceiver()
+        self.room_id = library.protocol.ANY_ROOM
+        self.token = 0
+        self.inputs = library.protocol.InputSender()
         self.server_connect(SERVER_IP, SERVER_PORT)
-        self.clock = pygame.time.Clock()
     
     def run(self):
         while True:
+            self.profiler.tick()
             # Recieve and read message
-            data, address = self.connection.recvfrom(1024)
-            state: Dict[str, Dict] = json.loads(data)
-            ball = state['Ball']
-            ball_pos = ball['Position']
-            # Construct input
-            new_y = ball_pos[1]
-            message_dict = {
-                'PlayerInput': {
-                    'Position': new_y
-                }
-            }
-            message_bytes = json.dumps(message_dict)
+            try:
+                data, address = self.connection.recvfrom(1024)
+            except socket.timeout:
+                # Lost handshake, or the server lost track of the bot's
+                # address, try again (with the session's token if any)
+                self.server_connect(SERVER_IP, SERVER_PORT)
+                continue
+            try:
+                message = library.protocol.decode(data)
+                self.room_id = library.protocol.room_of(data)
+            except library.protocol.ProtocolError:
+                continue
+            if isinstance(message, library.protocol.Welcome):
+                self.token = message.token
+                continue
+            if not isinstance(
+                message,
+                (library.protocol.Snapshot, library.protocol.SnapshotDelta)
+            ):
+                continue
+            state = self.snapshots.receive(message)
+            if state is None:
+                # Outdated, or its base was lost
+                continue
+            # Construct input, follow the ball
+            message_bytes = library.protocol.encode(
+                self.inputs.message(state.tick, state.ball_y),
+                self.room_id
+            )
             # Send
             self.connection.sendto(message_bytes, (SERVER_IP, SERVER_PORT))
     
@@ -46,8 +79,11 @@ class Bot:
         """
         # Maybe later create a proper 3-way handshake
         self.connection.sendto(
-            WELCOME_MESSAGE,
-            (serverIP, serverIP)
+            library.protocol.encode(
+                library.protocol.Handshake(token=self.token),
+                library.protocol.ANY_ROOM
+            ),
+            (serverIP, serverPort)
         )
         
         
@@ -1,2 +1,5 @@
 SERVER_IP = "127.0.0.1"
-SERVER_PORT = 5050
\ No newline at end of file
+SERVER_PORT = 5050
+# Handshake again when nothing came from the server for this long,
+# shorter than the server's idle timeout to keep a waiting bot connected
+RECONNECT_AFTER_S = 1.0
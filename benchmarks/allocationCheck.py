@@ -0,0 +1,141 @@
+"""
+Checks that the ball's physics doesn't allocate per tick.  Ticks of
+`GameState.ball_physics` run under tracemalloc, and the check fails
+when the physics code (in library/ or server/) keeps any memory
+allocated, or when the memory a tick allocates at once goes over the
+bound of its case:
+
+    python -m benchmarks.allocationCheck
+"""
+from typing import List, NamedTuple, Tuple
+import argparse
+import os
+import sys
+import tracemalloc
+
+import library.constants
+import library.customObjects
+import server.gameState
+
+
+# Allocations of these files are the physics code's
+TRACED_FILES = [
+    tracemalloc.Filter(True, os.path.join('*', package, '*'))
+    for package in ('library', 'server')
+]
+
+
+class Case(NamedTuple):
+    name: str
+    # Ball's position and velocity at the start of each run
+    position: Tuple[float, float]
+    velocity: Tuple[float, float]
+    # Ticks simulated by each run
+    ticks: int
+    # Most memory a tick may allocate at once (B)
+    max_peak_bytes: int
+
+
+CASES = [
+    # Stays in the middle of the field, nothing is hit
+    Case('free flight', (250.0, 150.0), (0.6, 0.8), 50, 512),
+    # Hits the top wall in the first tick and bounces off it
+    Case('single bounce', (250.0, 10.5), (0.6, -0.8), 1, 512),
+]
+
+
+class CaseResult(NamedTuple):
+    case: Case
+    ticks: int
+    # Blocks the physics code allocated and didn't free
+    retained_blocks: int
+    retained_bytes: int
+    # Most memory allocated at once during a tick
+    peak_bytes: int
+
+    def failures(self) -> List[str]:
+        failures = []
+        if self.retained_blocks:
+            failures.append("{} blocks ({} B) retained".format(
+                self.retained_blocks,
+                self.retained_bytes
+            ))
+        if self.peak_bytes > self.case.max_peak_bytes:
+            failures.append("peak of {} B over the bound of {} B".format(
+                self.peak_bytes,
+                self.case.max_peak_bytes
+            ))
+        return failures
+
+
+def _start(game_state: server.gameState.GameState, case: Case) -> None:
+    ball = game_state.ball
+    (ball.x_pos, ball.y_pos) = case.position
+    (ball.x_vel, ball.y_vel) = case.velocity
+    game_state.resolved_collision_id = library.customObjects.NO_ENTITY
+
+
+def run_case(case: Case, repeats: int) -> CaseResult:
+    game_state = server.gameState.GameState()
+    game_state.log_goals = False
+    t = library.constants.PHYSICS_STEP_MS
+    # Warm up, so that caches (e.g. of the field's sides) are built
+    # before tracing
+    _start(game_state, case)
+    for _ in range(case.ticks):
+        game_state.ball_physics(t)
+
+    peak_bytes = 0
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(TRACED_FILES)
+        for _ in range(repeats):
+            _start(game_state, case)
+            for _ in range(case.ticks):
+                (current, _) = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                game_state.ball_physics(t)
+                (_, peak) = tracemalloc.get_traced_memory()
+                peak_bytes = max(peak_bytes, peak - current)
+        after = tracemalloc.take_snapshot().filter_traces(TRACED_FILES)
+    finally:
+        tracemalloc.stop()
+    retained = [
+        stat
+        for stat in after.compare_to(before, 'lineno')
+        if stat.count_diff > 0
+    ]
+    return CaseResult(
+        case,
+        repeats*case.ticks,
+        sum(stat.count_diff for stat in retained),
+        sum(stat.size_diff for stat in retained),
+        peak_bytes
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check that ball physics doesn't allocate per tick"
+    )
+    parser.add_argument('--repeats', type=int, default=20,
+                        help="Runs of each case")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for case in CASES:
+        result = run_case(case, args.repeats)
+        failures = result.failures()
+        failed = failed or bool(failures)
+        print("{}: {} ticks, {} blocks retained, peak {} B per tick{}".format(
+            case.name,
+            result.ticks,
+            result.retained_blocks,
+            result.peak_bytes,
+            "" if not failures else " - FAILED: " + ", ".join(failures)
+        ))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Measures how long the processes take to import their code, using
+`python -X importtime`.  Launchers start the processes right away, so
+the modules they import are measured instead:
+
+    python -m benchmarks.importTime
+    python -m benchmarks.importTime --repeats 5 --output imports.json
+"""
+from typing import Dict, List, NamedTuple
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Role of the process and the module its launcher imports
+TARGETS = {
+    'server (launchServer.py)': 'server.gameServer',
+    'bot (launchBot.py)': 'aiOpponent.bot',
+    'client (launchClient.py)': 'client.game',
+}
+# Modules which headless processes must not import
+FORBIDDEN_HEADLESS = ('pygame',)
+
+
+class ImportedModule(NamedTuple):
+    name: str
+    # Import time of the module alone and together with its imports
+    self_us: int
+    cumulative_us: int
+    # Depth in the import tree, 0 for the imported module itself
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportedModule]:
+    """Parses the lines `-X importtime` writes to stderr"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # Header line
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append(ImportedModule(
+            name.strip(),
+            int(fields[0]),
+            int(fields[1]),
+            depth
+        ))
+    return modules
+
+
+def measure(module: str) -> List[ImportedModule]:
+    """Imports the module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def summarize(
+    runs: List[List[ImportedModule]],
+    module: str,
+    top: int
+) -> Dict:
+    """
+    Median total import time of the module over the runs, its most
+    expensive imports (by their own time, top level packages summed up)
+    and whether a forbidden module was imported
+    """
+    totals = [
+        next(imported.cumulative_us for imported in run
+             if imported.name == module)
+        for run in runs
+    ]
+    packages: Dict[str, int] = {}
+    for imported in runs[0]:
+        package = imported.name.split('.')[0]
+        packages[package] = packages.get(package, 0) + imported.self_us
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    names = {imported.name for imported in runs[0]}
+    return {
+        'module': module,
+        'total_ms': statistics.median(totals) * 1e-3,
+        'modules_imported': len(runs[0]),
+        'heaviest_packages_ms': {
+            package: self_us * 1e-3 for (package, self_us) in heaviest
+        },
+        'forbidden': sorted(
+            name for name in names if name.split('.')[0] in FORBIDDEN_HEADLESS
+        ),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure import time of the processes"
+    )
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5,
+                        help="Number of the heaviest packages shown")
+    parser.add_argument('--output', help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    headless_ok = True
+    for (role, module) in TARGETS.items():
+        runs = [measure(module) for _ in range(args.repeats)]
+        summary = summarize(runs, module, args.top)
+        results[role] = summary
+        print("{}: {:.1f} ms, {} modules".format(
+            role,
+            summary['total_ms'],
+            summary['modules_imported']
+        ))
+        for (package, ms) in summary['heaviest_packages_ms'].items():
+            print("    {:24s} {:8.1f} ms".format(package, ms))
+        if not module.startswith('client.') and summary['forbidden']:
+            headless_ok = False
+            print("    imports {}!".format(", ".join(summary['forbidden'])))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 0 if headless_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
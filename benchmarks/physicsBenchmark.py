@@ -0,0 +1,476 @@
+"""
+Micro-benchmarks of the physics library.  Inputs are generated from
+fixed seeds, so every run times exactly the same work.  Results are
+written as JSON and can be compared against a stored baseline:
+
+    python -m benchmarks.physicsBenchmark --output new.json
+    python -m benchmarks.physicsBenchmark --compare baseline.json
+"""
+from typing import Callable, Dict, List, NamedTuple, Tuple
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import library.collisions
+import library.constants
+import library.customObjects
+import library.utilities
+import server.gameState
+import server.headlessEngine
+
+
+Point = Tuple[float, float]
+
+
+def _point(rng: random.Random, size: float = 100.0) -> Point:
+    # Round coordinates now and then, so that axis-aligned and touching
+    # cases are common
+    if rng.random() < 0.3:
+        return (float(rng.randint(0, 10))*size/10,
+                float(rng.randint(0, 10))*size/10)
+    return (rng.uniform(0, size), rng.uniform(0, size))
+
+
+def segment_cases(
+    rng: random.Random,
+    n: int
+) -> List[Tuple[Point, Point, Point, Point]]:
+    """
+    Vector and segment pairs: general ones, parallel ones, collinear
+    (overlapping or not) ones and ones touching at their ends
+    """
+    cases = []
+    for i in range(n):
+        kind = i % 4
+        (a, b, c, d) = (_point(rng), _point(rng), _point(rng), _point(rng))
+        if kind == 1:
+            # Parallel, shifted by an offset
+            offset = rng.uniform(1, 10)
+            (c, d) = ((a[0], a[1] + offset), (b[0], b[1] + offset))
+        elif kind == 2:
+            # On the same line
+            (t1, t2) = (rng.uniform(-1, 2), rng.uniform(-1, 2))
+            c = (a[0] + t1*(b[0] - a[0]), a[1] + t1*(b[1] - a[1]))
+            d = (a[0] + t2*(b[0] - a[0]), a[1] + t2*(b[1] - a[1]))
+        elif kind == 3:
+            # The vector ends on the segment's start
+            c = b
+        cases.append((a, b, c, d))
+    return cases
+
+
+def circle_cases(
+    rng: random.Random,
+    n: int
+) -> List[Tuple[Point, Point, Point, float]]:
+    """
+    Vector and circle pairs: crossing, tangent, starting inside and
+    missing ones
+    """
+    cases = []
+    for i in range(n):
+        kind = i % 4
+        origin = _point(rng)
+        r = rng.uniform(1, 20)
+        (a, b) = (_point(rng), _point(rng))
+        if kind == 0:
+            # Through the center
+            b = (2*origin[0] - a[0], 2*origin[1] - a[1])
+        elif kind == 1:
+            # Tangent horizontal line
+            a = (origin[0] - 2*r, origin[1] + r)
+            b = (origin[0] + 2*r, origin[1] + r)
+        elif kind == 2:
+            # Starts inside
+            a = (origin[0] + r/2, origin[1])
+        cases.append((a, b, origin, r))
+    return cases
+
+
+def ball_brick_cases(
+    rng: random.Random,
+    n: int
+) -> List[Tuple[library.customObjects.Ball, library.customObjects.Brick,
+                Point, Point]]:
+    """
+    Moves of the ball towards a brick: at its sides, at its corners,
+    along its sides and far from it
+    """
+    ball = library.customObjects.Ball(scale=library.constants.BALL_RADIUS)
+    r = ball.x_scale
+    cases = []
+    for i in range(n):
+        kind = i % 4
+        brick = library.customObjects.Brick(
+            x=rng.uniform(0, 100),
+            y=rng.uniform(0, 100),
+            x_scale=library.constants.PLAYER_SIZE[0],
+            y_scale=library.constants.PLAYER_SIZE[1]
+        )
+        center = (brick.x_pos + brick.x_scale/2, brick.y_pos + brick.y_scale/2)
+        if kind == 0:
+            # Straight at the brick
+            start = (center[0] + rng.choice((-1, 1))*rng.uniform(30, 60),
+                     center[1] + rng.uniform(-20, 20))
+            target = center
+        elif kind == 1:
+            # Diagonally at a corner
+            corner = (brick.x_pos + rng.choice((0, brick.x_scale)),
+                      brick.y_pos + rng.choice((0, brick.y_scale)))
+            start = (corner[0] + rng.choice((-1, 1))*rng.uniform(15, 40),
+                     corner[1] + rng.choice((-1, 1))*rng.uniform(15, 40))
+            target = corner
+        elif kind == 2:
+            # Sliding along the left side of the stadium
+            start = (brick.x_pos - r, brick.y_pos - rng.uniform(10, 40))
+            target = (brick.x_pos - r, brick.y_pos + rng.uniform(10, 40))
+        else:
+            # Far away
+            start = (center[0] + 200, center[1] + rng.uniform(-50, 50))
+            target = (start[0] + rng.uniform(-30, 30),
+                      start[1] + rng.uniform(-30, 30))
+        move = (target[0] - start[0], target[1] - start[1])
+        cases.append((ball, brick, start, move))
+    return cases
+
+
+def collision_list_cases(
+    rng: random.Random,
+    n: int
+) -> List[Tuple[Point, List[library.customObjects.Collision]]]:
+    """Lists of 0 to 8 collisions along a move"""
+    cases = []
+    for _ in range(n):
+        start = _point(rng)
+        collisions = []
+        for _ in range(rng.randint(0, 8)):
+            collision = library.customObjects.Collision()
+            collision.time = rng.random()
+            collision.position = _point(rng)
+            collision.normal = _point(rng)
+            collisions.append(collision)
+        cases.append((start, collisions))
+    return cases
+
+
+def _nonzero_normal(rng: random.Random) -> Point:
+    normal = (0.0, 0.0)
+    while normal == (0.0, 0.0):
+        normal = (float(rng.randint(-1, 1)), float(rng.randint(-1, 1)))
+        if rng.random() < 0.5:
+            normal = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+    return normal
+
+
+def resolve_cases(
+    rng: random.Random,
+    n: int
+) -> List[Tuple[Point, Point, library.customObjects.Collision]]:
+    cases = []
+    for _ in range(n):
+        collision = library.customObjects.Collision()
+        collision.time = rng.random()
+        collision.position = _point(rng)
+        collision.normal = _nonzero_normal(rng)
+        move = (rng.uniform(-10, 10), rng.uniform(-10, 10))
+        cases.append((collision.position, move, collision))
+    return cases
+
+
+def mirror_cases(rng: random.Random, n: int) -> List[Tuple[Point, Point]]:
+    """Reflections off axis-aligned and arbitrary normals"""
+    return [
+        ((rng.uniform(-10, 10), rng.uniform(-10, 10)), _nonzero_normal(rng))
+        for _ in range(n)
+    ]
+
+
+# Function running through all the inputs once and the number of calls
+# it does
+Run = Tuple[Callable[[], None], int]
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Builds the inputs from the seed
+    setup: Callable[[int], Run]
+
+
+def _over_cases(function, cases) -> Run:
+    def run():
+        for case in cases:
+            function(*case)
+    return (run, len(cases))
+
+
+def _supported_cases(function, cases) -> List:
+    """
+    Drops the cases the function rejects with ValueError (the NumPy
+    implementation does so for parallel lines not along an axis)
+    """
+    supported = []
+    for case in cases:
+        try:
+            function(*case)
+        except ValueError:
+            continue
+        supported.append(case)
+    return supported
+
+
+CASES = 1000
+TICKS = 2000
+
+
+def _tick_state_run(seed: int) -> Run:
+    game_state = server.gameState.GameState()
+    game_state.log_goals = False
+    rng = random.Random(seed)
+    policies = (
+        (game_state.player_brick, server.headlessEngine.NoisyTrackingPolicy()),
+        (game_state.enemy_brick, server.headlessEngine.NoisyTrackingPolicy()),
+    )
+    # Policies are run beforehand, only the physics is timed
+    moves = []
+    for _ in range(TICKS):
+        for (player, policy) in policies:
+            policy(game_state, player, rng)
+        moves.append((
+            game_state.player_brick.desired_move[1],
+            game_state.enemy_brick.desired_move[1]
+        ))
+        game_state.tick_state(library.constants.PHYSICS_STEP_MS)
+    start = game_state.new_save_buffer()
+    server.gameState.GameState().save(start)
+
+    def run():
+        game_state.load(start)
+        for (player_move, enemy_move) in moves:
+            game_state.player_brick.desired_move[1] = player_move
+            game_state.enemy_brick.desired_move[1] = enemy_move
+            game_state.tick_state(library.constants.PHYSICS_STEP_MS)
+    return (run, TICKS)
+
+
+BENCHMARKS = [
+    Benchmark(
+        'collision_vector_segment',
+        lambda seed: _over_cases(
+            library.collisions.collision_vector_segment,
+            segment_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark(
+        'collision_vector_segment_numpy',
+        lambda seed: _over_cases(
+            library.collisions.collision_vector_segment_numpy,
+            _supported_cases(
+                library.collisions.collision_vector_segment_numpy,
+                segment_cases(random.Random(seed), CASES)
+            )
+        )
+    ),
+    Benchmark(
+        'collision_vector_circle',
+        lambda seed: _over_cases(
+            library.collisions.collision_vector_circle,
+            circle_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark(
+        'collision_ball_brick',
+        lambda seed: _over_cases(
+            library.collisions.collision_ball_brick,
+            ball_brick_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark(
+        'get_closest_collision',
+        lambda seed: _over_cases(
+            library.collisions.get_closest_collision,
+            collision_list_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark(
+        'resolve_collision',
+        lambda seed: _over_cases(
+            library.collisions.resolve_collision,
+            resolve_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark(
+        'mirror_vector_2d',
+        lambda seed: _over_cases(
+            library.utilities.mirror_vector_2d,
+            mirror_cases(random.Random(seed), CASES)
+        )
+    ),
+    Benchmark('tick_state', _tick_state_run),
+]
+
+
+def time_benchmark(
+    benchmark: Benchmark,
+    seed: int,
+    repeats: int
+) -> Dict[str, float]:
+    """
+    Runs the benchmark `repeats` times (after a warm-up run).  The best
+    run is the most stable estimate, the median shows the noise.
+    """
+    (run, calls) = benchmark.setup(seed)
+    run()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        run()
+        times.append(time.perf_counter_ns() - start)
+    return {
+        'calls': calls,
+        'best_ns_per_call': min(times) / calls,
+        'median_ns_per_call': statistics.median(times) / calls,
+    }
+
+
+def tick_allocations(seed: int) -> Dict[str, float]:
+    """Memory allocated by `tick_state` (in steady state)"""
+    (run, calls) = _tick_state_run(seed)
+    run()
+    tracemalloc.start()
+    try:
+        (before, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        (after, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'calls': calls,
+        'peak_bytes': peak - before,
+        'retained_bytes': after - before,
+    }
+
+
+def run_all(seed: int, repeats: int, only: List[str] = None) -> Dict:
+    results = {}
+    for benchmark in BENCHMARKS:
+        if only and benchmark.name not in only:
+            continue
+        results[benchmark.name] = time_benchmark(benchmark, seed, repeats)
+    if not only or 'tick_state' in only:
+        results['tick_state_allocations'] = tick_allocations(seed)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+            'repeats': repeats,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+class Regression(NamedTuple):
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def ratio(self) -> float:
+        if self.baseline == 0:
+            return float('inf')
+        return self.current / self.baseline
+
+
+# Metrics compared between runs, lower is better for all of them
+COMPARED_METRICS = ('best_ns_per_call', 'peak_bytes', 'retained_bytes')
+
+
+def compare(
+    baseline: Dict,
+    current: Dict,
+    threshold: float
+) -> List[Regression]:
+    """
+    Finds metrics which got worse by more than `threshold` (relative) in
+    benchmarks present in both runs
+    """
+    regressions = []
+    for (name, result) in current['results'].items():
+        base_result = baseline['results'].get(name)
+        if base_result is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in result or metric not in base_result:
+                continue
+            if result[metric] > base_result[metric] * (1 + threshold):
+                regressions.append(Regression(
+                    name, metric, base_result[metric], result[metric]
+                ))
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the physics library"
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--only', nargs='*', default=None,
+                        choices=[benchmark.name for benchmark in BENCHMARKS],
+                        help="Run only these benchmarks")
+    parser.add_argument('--output', help="Write the results to this file")
+    parser.add_argument('--compare',
+                        help="Baseline results to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_all(args.seed, args.repeats, args.only)
+    for (name, result) in results['results'].items():
+        if 'best_ns_per_call' in result:
+            print("{:32s} {:10.0f} ns/call (median {:.0f})".format(
+                name,
+                result['best_ns_per_call'],
+                result['median_ns_per_call']
+            ))
+        else:
+            print("{:32s} {:10d} B peak, {} B retained over {} ticks".format(
+                name,
+                result['peak_bytes'],
+                result['retained_bytes'],
+                result['calls']
+            ))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold)
+        for regression in regressions:
+            print("REGRESSION {} {}: {:.0f} -> {:.0f} ({:.2f}x)".format(
+                regression.name,
+                regression.metric,
+                regression.baseline,
+                regression.current,
+                regression.ratio()
+            ))
+        if regressions:
+            return 1
+        print("No regressions over {:.0%}".format(args.threshold))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Compares the binary protocol (`library.protocol`) against the JSON
+messages it replaced: size of each message and time to encode and
+decode it.
+
+    python -m benchmarks.protocolBenchmark
+    python -m benchmarks.protocolBenchmark --repeats 7 --output protocol.json
+"""
+from typing import Callable, Dict, List, Tuple
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import library.protocol
+
+
+# Messages with the contents of a typical tick
+SNAPSHOT = library.protocol.Snapshot(
+    123456, 251.37521, 148.90412, -0.7071067, 0.7071067, 120.5, 95.25, 3, 2
+)
+# Usual delta, only the ball moved
+DELTA = library.protocol.snapshot_delta(
+    SNAPSHOT,
+    SNAPSHOT._replace(tick=123457, ball_x=250.66810, ball_y=149.61123)
+)
+INPUT = library.protocol.InputMessage(
+    123456, 4321, (146.50412, 147.30412, 148.10412, 148.90412)
+)
+SCORE = library.protocol.ScoreEvent(123456, 3, 2)
+
+
+def json_snapshot(snapshot: library.protocol.Snapshot) -> Dict:
+    """Snapshot in the JSON layout the bot used to read"""
+    return {
+        'Tick': snapshot.tick,
+        'Ball': {
+            'Position': [snapshot.ball_x, snapshot.ball_y],
+            'Velocity': [snapshot.ball_x_vel, snapshot.ball_y_vel],
+        },
+        'Players': {
+            'Position': [snapshot.player_y, snapshot.enemy_y],
+        },
+        'Score': [snapshot.player_score, snapshot.enemy_score],
+    }
+
+
+def json_input(message: library.protocol.InputMessage) -> Dict:
+    return {
+        'Tick': message.tick,
+        'Sequence': message.sequence,
+        'PlayerInput': {
+            'Position': list(message.inputs)
+        }
+    }
+
+
+def json_score(message: library.protocol.ScoreEvent) -> Dict:
+    return {
+        'Tick': message.tick,
+        'Score': [message.player_score, message.enemy_score]
+    }
+
+
+def cases() -> Dict[str, Tuple[library.protocol.Message, Dict]]:
+    """Each message in both representations"""
+    return {
+        'snapshot': (SNAPSHOT, json_snapshot(SNAPSHOT)),
+        # Compared with the full JSON snapshot which it replaces
+        'snapshot delta': (DELTA, json_snapshot(SNAPSHOT)),
+        'input': (INPUT, json_input(INPUT)),
+        'score': (SCORE, json_score(SCORE)),
+    }
+
+
+def time_per_call(run: Callable[[], None], calls: int, repeats: int) -> float:
+    """Median time of a call over the repeats (us)"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            run()
+        times.append((time.perf_counter_ns() - start) / calls)
+    return statistics.median(times) * 1e-3
+
+
+def measure(
+    message: library.protocol.Message,
+    as_dict: Dict,
+    calls: int,
+    repeats: int
+) -> Dict:
+    binary = library.protocol.encode(message)
+    text = json.dumps(as_dict).encode()
+    # Positions are rounded to floats, so only the type can be compared
+    assert type(library.protocol.decode(binary)) is type(message)
+    return {
+        'binary_bytes': len(binary),
+        'json_bytes': len(text),
+        'binary_encode_us': time_per_call(
+            lambda: library.protocol.encode(message), calls, repeats
+        ),
+        'json_encode_us': time_per_call(
+            lambda: json.dumps(as_dict).encode(), calls, repeats
+        ),
+        'binary_decode_us': time_per_call(
+            lambda: library.protocol.decode(binary), calls, repeats
+        ),
+        'json_decode_us': time_per_call(
+            lambda: json.loads(text), calls, repeats
+        ),
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the binary protocol with JSON messages"
+    )
+    parser.add_argument('--calls', type=int, default=20000,
+                        help="Calls timed together")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for (name, (message, as_dict)) in cases().items():
+        result = measure(message, as_dict, args.calls, args.repeats)
+        results[name] = result
+        print("{}: {} B vs {} B JSON".format(
+            name,
+            result['binary_bytes'],
+            result['json_bytes']
+        ))
+        for operation in ('encode', 'decode'):
+            binary_us = result['binary_{}_us'.format(operation)]
+            json_us = result['json_{}_us'.format(operation)]
+            print("    {} {:6.2f} us vs {:6.2f} us JSON ({:.1f}x)".format(
+                operation,
+                binary_us,
+                json_us,
+                json_us / binary_us
+            ))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+from functools import singledispatch
+
+import client.fieldRender
+import library.customObjects
+
+
+# Drawing of the simulation's entities lives on the client side, so that
+# the model (and with it the server and bots) doesn't depend on pygame
+
+
+@singledispatch
+def draw_entity(
+    entity: library.customObjects.Entity,
+    renderer: client.fieldRender.PlayingFieldRenderer
+) -> None:
+    raise NotImplementedError(
+        "Can't draw {}".format(type(entity).__name__)
+    )
+
+
+@draw_entity.register
+def draw_ball(
+    ball: library.customObjects.Ball,
+    renderer: client.fieldRender.PlayingFieldRenderer
+) -> None:
+    renderer.draw_circle(
+        ball.color,
+        (ball.x_pos, ball.y_pos),
+        ball.x_scale
+    )
+
+
+@draw_entity.register
+def draw_brick(
+    brick: library.customObjects.Brick,
+    renderer: client.fieldRender.PlayingFieldRenderer
+) -> None:
+    renderer.draw_rect(
+        brick.color,
+        (
+            brick.x_pos,
+            brick.y_pos,
+            brick.x_scale,
+            brick.y_scale
+        )
+    )
@@ -1,17 +1,28 @@
 import pygame
 import pygame.freetype
 
+import client.entityRender
 import client.eventHandler
 import client.fieldRender
 import client.gameState
 import client.inputProcessing
+import client.rollback
 import library.constants
+import library.profiling
+import library.timestep
 
 class Game:
     quit_game: bool
     status: library.constants.GameStatus
     window: pygame.Surface
     field_renderer: client.fieldRender.PlayingFieldRenderer
+    # Splits frame time into fixed physics steps.  Its `alpha` tells how
+    # far between 2 physics steps the rendered frame is
+    timestep: library.timestep.FixedTimestep
+    # Simulates ahead of the remote player's inputs, see
+    # `add_remote_input`
+    rollback: client.rollback.RollbackSession
+    profiler: library.profiling.TickProfiler
 
     def __init__(self):
         pygame.init()
@@ -24,10 +35,13 @@ class Game:
             self.window
         )
         self.clock = pygame.time.Clock()
+        self.timestep = library.timestep.FixedTimestep()
+        self.profiler = library.profiling.TickProfiler('client')
         self.quit_game = False
         self.status = library.constants.GameStatus.RUNNING
 
         self.game_state = client.gameState.GameState()
+        self.rollback = client.rollback.RollbackSession(self.game_state)
 
         self.event_processor = client.eventHandler.EventHandler()
         self.mouse_processor = client.inputProcessing.MouseInput(
@@ -56,7 +70,12 @@ class Game:
     def update_state(self):
         self.clock.tick(library.constants.TICK_RATE_LIMIT)
         if self.status == library.constants.GameStatus.RUNNING:
-            self.game_state.tick_state(self.clock.get_time())
+            if library.constants.FIXED_TIMESTEP:
+                steps = self.timestep.advance(self.clock.get_time())
+                for _ in range(steps):
+                    self.rollback.advance(self.timestep.step_ms)
+            else:
+                self.rollback.advance(self.clock.get_time())
         
 
     def render(self):
@@ -69,17 +88,28 @@ class Game:
             )
 
             # Draw players
-            self.game_state.player_brick.draw(self.field_renderer)
-            self.game_state.enemy_brick.draw(self.field_renderer)
+            client.entityRender.draw_entity(
+                self.game_state.player_brick,
+                self.field_renderer
+            )
+            client.entityRender.draw_entity(
+                self.game_state.enemy_brick,
+                self.field_renderer
+            )
 
             # Draw the ball
-            self.game_state.ball.draw(self.field_renderer)
+            client.entityRender.draw_entity(
+                self.game_state.ball,
+                self.field_renderer
+            )
         pygame.display.update()
 
     def run(self):
         while not self.quit_game:
+            self.profiler.tick()
             self.process_input()
             self.update_state()
             self.render()
+        self.profiler.close()
         pygame.quit()
 
@@ -1,24 +1,39 @@
+from array import array
 from math import copysign
-from typing import List
+from typing import Dict, Set
 from enum import Enum
 from functools import lru_cache
 
 import library.utilities
+import library.broadPhase
 import library.collisions
 import library.constants
 import library.customObjects
 
 
 class GameState:
+    # Entity ids of the field sides.  Bricks get ids after them
+    SIDE_LEFT, SIDE_UP, SIDE_RIGHT, SIDE_DOWN = range(4)
+
     ball: library.customObjects.Ball
     player_brick: library.customObjects.Player
     enemy_brick: library.customObjects.Player
+    player_id: int
+    enemy_id: int
+    # All bricks on the field (including players) by their entity ids
+    bricks: Dict[int, library.customObjects.Brick]
+    next_entity_id: int
+    # Broad phase over the bricks, keep it in sync with `update_brick`
+    broad_phase: library.broadPhase.SpatialHash
     player_score: int
     enemy_score: int
-    # Flags used to not check the same collision twice.
-    # 4 sides : LEFT, UP, RIGHT, DOWN, player and enemy.  Needs to be
-    # preserved between ticks
-    collisions_resolved: List[bool]
+    # Id of the entity whose collision was just resolved, used to not
+    # check the same collision twice.  Needs to be preserved between
+    # ticks
+    resolved_collision_id: int
+    # Scratch buffers reused by physics to not allocate on every tick
+    impact_scratch: library.customObjects.Impact
+    broad_phase_scratch: Set[int]
 
     def __init__(self) -> None:
         self.ball = library.customObjects.Ball(
@@ -37,16 +52,114 @@ class GameState:
             x_scale=library.constants.PLAYER_SIZE[0],
             y_scale=library.constants.PLAYER_SIZE[1]
         )
+        self.bricks = {}
+        self.next_entity_id = self.SIDE_DOWN + 1
+        self.broad_phase = library.broadPhase.SpatialHash()
+        self.player_id = self.add_brick(self.player_brick)
+        self.enemy_id = self.add_brick(self.enemy_brick)
         self.player_score = 0
         self.enemy_score = 0
-        self.collisions_resolved = [False]*6
+        self.resolved_collision_id = library.customObjects.NO_ENTITY
+        self.impact_scratch = library.customObjects.Impact()
+        self.broad_phase_scratch = set()
 
     def tick_state(self, t):
         # Players' moves
-        for player in (self.player_brick, self.enemy_brick):
-            self.players_physics(player)
+        for player_id in (self.player_id, self.enemy_id):
+            self.players_physics(player_id)
+            self.update_brick(player_id)
         self.ball_physics(t)
 
+    def add_brick(self, brick: library.customObjects.Brick) -> int:
+        """
+        Places the brick on the field.
+        @returns Entity id of the brick
+        """
+        brick_id = self.next_entity_id
+        self.next_entity_id += 1
+        self.bricks[brick_id] = brick
+        self.broad_phase.insert(
+            brick_id,
+            library.broadPhase.entity_box(brick)
+        )
+        return brick_id
+
+    def remove_brick(self, brick_id: int) -> None:
+        del self.bricks[brick_id]
+        self.broad_phase.remove(brick_id)
+        if self.resolved_collision_id == brick_id:
+            self.resolved_collision_id = library.customObjects.NO_ENTITY
+
+    def update_brick(self, brick_id: int) -> None:
+        """Must be called after the brick is moved"""
+        self.broad_phase.update(
+            brick_id,
+            library.broadPhase.entity_box(self.bricks[brick_id])
+        )
+
+    # Values saved for the ball and for every brick by `save`
+    BALL_SAVE_SIZE = 4
+    BRICK_SAVE_SIZE = 4
+
+    def save_size(self) -> int:
+        """Number of values `save` writes for the current set of bricks"""
+        return (self.BALL_SAVE_SIZE
+                + self.BRICK_SAVE_SIZE*len(self.bricks)
+                + 3)
+
+    def new_save_buffer(self) -> array:
+        """Allocates a buffer which can be passed to `save`"""
+        return array('d', bytes(8*self.save_size()))
+
+    def save(self, buffer: array) -> None:
+        """
+        Writes the whole simulation state into a preallocated buffer
+        (see `new_save_buffer`), so that it can be restored by `load`.
+        The layout is: ball position and velocity, then position and
+        desired move of every brick in the order of their ids (zero move
+        for bricks which aren't players), then both scores and
+        `resolved_collision_id`.  The set of bricks must stay the same
+        between `save` and `load`.
+        """
+        ball = self.ball
+        buffer[0] = ball.x_pos
+        buffer[1] = ball.y_pos
+        buffer[2] = ball.x_vel
+        buffer[3] = ball.y_vel
+        i = self.BALL_SAVE_SIZE
+        for brick in self.bricks.values():
+            buffer[i] = brick.x_pos
+            buffer[i + 1] = brick.y_pos
+            if isinstance(brick, library.customObjects.Player):
+                buffer[i + 2] = brick.desired_move[0]
+                buffer[i + 3] = brick.desired_move[1]
+            else:
+                buffer[i + 2] = 0.0
+                buffer[i + 3] = 0.0
+            i += self.BRICK_SAVE_SIZE
+        buffer[i] = self.player_score
+        buffer[i + 1] = self.enemy_score
+        buffer[i + 2] = self.resolved_collision_id
+
+    def load(self, buffer: array) -> None:
+        """Restores the state written by `save`"""
+        ball = self.ball
+        ball.x_pos = buffer[0]
+        ball.y_pos = buffer[1]
+        ball.x_vel = buffer[2]
+        ball.y_vel = buffer[3]
+        i = self.BALL_SAVE_SIZE
+        for (brick_id, brick) in self.bricks.items():
+            if brick.x_pos != buffer[i] or brick.y_pos != buffer[i + 1]:
+                brick.moveTo(buffer[i], buffer[i + 1])
+                self.update_brick(brick_id)
+            if isinstance(brick, library.customObjects.Player):
+                brick.set_desired_move(buffer[i + 2], buffer[i + 3])
+            i += self.BRICK_SAVE_SIZE
+        self.player_score = int(buffer[i])
+        self.enemy_score = int(buffer[i + 1])
+        self.resolved_collision_id = int(buffer[i + 2])
+
     @lru_cache(maxsize=64)
     def generate_sides(r):
         """
@@ -85,138 +198,104 @@ class GameState:
         walls and bricks) + checks if it touched side walls (win 
         condition)
         """
-        cur_move = (
-            self.ball.x_vel*t*1e-1,
-            self.ball.y_vel*t*1e-1
-        )
-        cur_start = (
-            self.ball.x_pos,
-            self.ball.y_pos
-        )
-        cur_end = (
-            cur_start[0] + cur_move[0],
-            cur_start[1] + cur_move[1]
-        )
+        # The move is kept in plain floats and impacts are written into
+        # the scratch buffer, so nothing is allocated until the ball
+        # actually hits something
+        move_x = self.ball.x_vel*t*1e-1
+        move_y = self.ball.y_vel*t*1e-1
+        start_x = self.ball.x_pos
+        start_y = self.ball.y_pos
 
         # LEFT, UP, RIGHT, DOWN. Cached method, no need to worry
         # about performance if the size is unchanged
-        sides = self.generate_sides(self.ball.x_scale)
-        
-        collision_list: List[library.customObjects.Collision] = None
-        # Indexes in collisionsResolved list of found collisions
-        collisions_ids: List[int] = []
-        while (
-            collision_list == None
-            or (collision_list
-                and library.utilities.distance(cur_start, cur_end) != 0)    # Not magnitude of move!!!
-        ):
-            # Find all possible collisions
-            collision_list = []
-            collisions_ids = []
+        r = self.ball.x_scale
+        sides = GameState.generate_sides(r)
+        impact = self.impact_scratch
+        candidates = self.broad_phase_scratch
+        while True:
+            end_x = start_x + move_x
+            end_y = start_y + move_y
+            # Resolution of the collision skips only one iteration
+            skipped = self.resolved_collision_id
+            self.resolved_collision_id = library.customObjects.NO_ENTITY
+            # Find the first impact along the move
+            impact.reset()
             # Checking sides
             for i in range(len(sides)):
-                if self.collisions_resolved[i]:
-                    # Resolution of the collision skips only one
-                    # iteration
-                    self.collisions_resolved[i] = False
+                if i == skipped:
                     continue
                 side = sides[i]
-                new_collisions = library.collisions.collision_vector_segment(
-                    cur_start, cur_end, side[0], side[1]
+                library.collisions.impact_vector_segment(
+                    start_x, start_y, end_x, end_y,
+                    side[0][0], side[0][1], side[1][0], side[1][1],
+                    i, impact
                 )
-                collision_list += new_collisions
-                if new_collisions:
-                    collisions_ids += [i]*len(new_collisions)
-            # Collisions with player1
-            if self.collisions_resolved[4]:
-                self.collisions_resolved[4] = False
-            else:
-                new_collisions = library.collisions.collision_ball_brick(
-                    self.ball,
-                    self.player_brick,
-                    cur_start,
-                    cur_move
-                )
-                collision_list += new_collisions
-                if new_collisions:
-                    collisions_ids += [4]*len(new_collisions)
-            # Collisions with player2
-            if self.collisions_resolved[5]:
-                self.collisions_resolved[5] = False
-            else:
-                new_collisions = library.collisions.collision_ball_brick(
+            # Checking bricks close to the path of the ball (in order of
+            # their ids, so ties are resolved the same way every time)
+            self.broad_phase.query_into(
+                candidates,
+                min(start_x, end_x) - r,
+                min(start_y, end_y) - r,
+                max(start_x, end_x) + r,
+                max(start_y, end_y) + r
+            )
+            for brick_id in (sorted(candidates) if len(candidates) > 1
+                             else candidates):
+                if brick_id == skipped:
+                    continue
+                library.collisions.impact_ball_brick(
                     self.ball,
-                    self.enemy_brick,
-                    cur_start,
-                    cur_move
+                    self.bricks[brick_id],
+                    start_x, start_y, move_x, move_y,
+                    brick_id, impact
                 )
-                collision_list += new_collisions
-                if new_collisions:
-                    collisions_ids += [5]*len(new_collisions)
-            if len(collision_list) == 0:
-                continue
-
-            # Extract the one closest to the start
-            closest = library.collisions.get_closest_collision(
-                cur_start,
-                collision_list
-            )
-            if closest == None:
-                # Must not happen as length check for 0 is not passed
-                raise IndexError("No collisions to handle!")
-            closest_collision = closest[0]
-            closest_collision_id = collisions_ids[closest[1]]
+            if impact.entity_id == library.customObjects.NO_ENTITY:
+                break
 
             # If the collision happens with the walls, update the score
             # and reset the game
-            if closest_collision_id in (0, 2):
+            if impact.entity_id in (self.SIDE_LEFT, self.SIDE_RIGHT):
                 winner: self.Players
-                if closest_collision_id == 0:
-                    # LEFT wall
+                if impact.entity_id == self.SIDE_LEFT:
                     winner = self.Players.PLAYER_2
-                elif closest_collision_id == 2:
-                    # RIGHT wall
+                elif impact.entity_id == self.SIDE_RIGHT:
                     winner = self.Players.PLAYER_1
                 self.handle_goal(winner)
                 return
 
-            # Resolve the closest collision
-            cur_move = library.collisions.resolve_collision(
-                cur_start,
-                cur_move,
-                closest_collision
-            )
-            cur_start = closest_collision.position
-            cur_end = (
-                cur_start[0] + cur_move[0],
-                cur_start[1] + cur_move[1]
+            # Resolve the first impact
+            (move_x, move_y) = library.collisions.resolve_collision(
+                impact.position,
+                (move_x, move_y),
+                impact
             )
+            (start_x, start_y) = impact.position
             (
                 self.ball.x_vel,
                 self.ball.y_vel
             ) = library.utilities.mirror_vector_2d(
                 (self.ball.x_vel, self.ball.y_vel),
-                closest_collision.normal
+                impact.normal
             )
-            self.collisions_resolved[closest_collision_id] = True
+            self.resolved_collision_id = impact.entity_id
+            if start_x + move_x == start_x and start_y + move_y == start_y:
+                # Nowhere to move anymore
+                break
         # No more collisions here
-        cur_end = (
-            cur_start[0] + cur_move[0],
-            cur_start[1] + cur_move[1]
-        )
-        self.ball.x_pos = cur_end[0]
-        self.ball.y_pos = cur_end[1]
+        self.ball.x_pos = start_x + move_x
+        self.ball.y_pos = start_y + move_y
 
 
     def players_physics(
         self,
-        player: library.customObjects.Player
+        player_id: int
     ):
         """
         Move the given player in such a way that it won't collide into
         the ball.  Instead it stops right before it (with a small gap).
         Motion is done according to the player's desiredMove field.
         """
+        player: library.customObjects.Player = self.bricks[player_id]
         # Convert the problem of moving brick into a ball to
         # moving ball into a brick (we see brick as the point of
         # reference), since we already have such collision checking
@@ -224,32 +303,27 @@ class GameState:
 
         # The ball therefore moves in opposite direction (as
         # point of reference has changed)
-        ball_move = (
+        impact = self.impact_scratch
+        impact.reset()
+        if not library.collisions.impact_ball_brick(
+            self.ball,
+            player,
+            self.ball.x_pos,
+            self.ball.y_pos,
             -player.desired_move[0],
-            -player.desired_move[1]
-        )
-        ball_pos = (self.ball.x_pos, self.ball.y_pos)
-
-        # Get the collision point
-        returned_val = library.collisions.get_closest_collision(
-            ball_pos,
-            library.collisions.collision_ball_brick(
-                self.ball, player, ball_pos, ball_move
-            )
-        )
-        if returned_val == None:
+            -player.desired_move[1],
+            player_id,
+            impact
+        ):
             # No collisions with the ball, can move freely
             player.move_by(player.desired_move[0], player.desired_move[1])
             player.set_desired_move(0.0, 0.0)
         else:
             # Collision found! Handle:
-            (collision, _) = returned_val
-
-            # Player's move would be the vector starting from the
-            # collision point to the ball
+            # Player moves only the part of its move before the impact
 
             # x component is always static, so let's leave it
-            y_player_move = ball_pos[1] - collision.position[1]
+            y_player_move = impact.time*player.desired_move[1]
             # To prevent repeated colliding with the ball (since
             # it causes the ball to bounce inside the brick), add
             # a little gap.
@@ -258,11 +332,7 @@ class GameState:
                                 library.constants.ERROR_MARGIN,
                                 y_player_move
                             ))
-            new_player_move = (
-                0,
-                y_player_move
-            )
-            player.move_by(new_player_move[0], new_player_move[1])
+            player.move_by(0, y_player_move)
             player.set_desired_move(0.0, 0.0)
         
 
@@ -271,16 +341,19 @@ class GameState:
         self.ball.y_pos = library.constants.BALL_STARTING_POS[1]
         self.ball.x_vel = library.constants.BALL_STARTING_SPEED[0]
         self.ball.y_vel = library.constants.BALL_STARTING_SPEED[1]
-        self.player_brick.x_pos = 0.0
-        self.player_brick.y_pos = 0.0
+        self.player_brick.moveTo(0.0, 0.0)
         self.player_brick.desired_move[0] = 0.0
         self.player_brick.desired_move[1] = 0.0
-        self.enemy_brick.x_pos = (library.constants.GAME_FIELD_SIZE[0]
-                                - library.constants.PLAYER_SIZE[0])
-        self.enemy_brick.y_pos = 0.0
+        self.enemy_brick.moveTo(
+            library.constants.GAME_FIELD_SIZE[0]
+            - library.constants.PLAYER_SIZE[0],
+            0.0
+        )
         self.enemy_brick.desired_move[0] = 0.0
         self.enemy_brick.desired_move[1] = 0.0
-        self.collisions_resolved = [False]*6
+        self.update_brick(self.player_id)
+        self.update_brick(self.enemy_id)
+        self.resolved_collision_id = library.customObjects.NO_ENTITY
 
     
     class Players(Enum):
@@ -0,0 +1,188 @@
+from array import array
+from typing import List
+import time
+
+import client.gameState
+import library.constants
+import library.customObjects
+
+
+class RollbackStats:
+    """Counters of the rollbacks done by a session"""
+    rollbacks: int
+    ticks_resimulated: int
+    # Number of rollbacks by their depth (ticks re-simulated)
+    depth_counts: List[int]
+    max_depth: int
+    resim_ns: int
+    max_resim_ns: int
+    # Rollbacks which took longer than the frame budget
+    budget_overruns: int
+    # Remote inputs too old to be rolled back to, applied from the
+    # oldest saved tick instead
+    late_inputs: int
+
+    def __init__(self, max_depth: int):
+        self.depth_counts = [0]*(max_depth + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self.rollbacks = 0
+        self.ticks_resimulated = 0
+        for depth in range(len(self.depth_counts)):
+            self.depth_counts[depth] = 0
+        self.max_depth = 0
+        self.resim_ns = 0
+        self.max_resim_ns = 0
+        self.budget_overruns = 0
+        self.late_inputs = 0
+
+    def add(self, depth: int, resim_ns: int, budget_ns: int) -> None:
+        self.rollbacks += 1
+        self.ticks_resimulated += depth
+        self.depth_counts[depth] += 1
+        self.max_depth = max(self.max_depth, depth)
+        self.resim_ns += resim_ns
+        self.max_resim_ns = max(self.max_resim_ns, resim_ns)
+        if resim_ns > budget_ns:
+            self.budget_overruns += 1
+
+    def mean_resim_ms(self) -> float:
+        if self.rollbacks == 0:
+            return 0.0
+        return self.resim_ns / self.rollbacks * 1e-6
+
+
+class RollbackSession:
+    """
+    Runs the local simulation ahead of the remote player's inputs.  The
+    remote player is predicted to keep its last confirmed input, and
+    when its real input for a past tick differs from the prediction,
+    the state saved before that tick is loaded and the ticks up to now
+    are simulated again with the corrected inputs.
+
+    States and inputs of the last `max_ticks` ticks are kept in rings
+    of preallocated buffers, indexed by tick modulo `max_ticks`.
+    """
+    game_state: client.gameState.GameState
+    local_player: library.customObjects.Player
+    remote_player: library.customObjects.Player
+    max_ticks: int
+    budget_ns: int
+    # Number of the tick to be simulated next
+    current_tick: int
+    # Remote inputs are confirmed up to this tick (exclusive)
+    confirmed_tick: int
+    # Input assumed for the remote player after the confirmed tick
+    predicted_move: List[float]
+    # Earliest tick whose inputs changed since it was simulated, None if
+    # there is nothing to roll back
+    rollback_tick: int
+    # State before each tick
+    saved_states: List[array]
+    # Desired moves (x, y) of the players and length of each tick
+    local_moves: array
+    remote_moves: array
+    tick_ms: array
+    stats: RollbackStats
+
+    def __init__(
+        self,
+        game_state: client.gameState.GameState,
+        max_ticks: int = library.constants.ROLLBACK_MAX_TICKS,
+        budget_ms: float = library.constants.ROLLBACK_FRAME_BUDGET_MS
+    ):
+        self.game_state = game_state
+        self.local_player = game_state.player_brick
+        self.remote_player = game_state.enemy_brick
+        self.max_ticks = max_ticks
+        self.budget_ns = int(budget_ms * 1e6)
+        self.current_tick = 0
+        self.confirmed_tick = 0
+        self.predicted_move = [0.0, 0.0]
+        self.rollback_tick = None
+        self.saved_states = [
+            game_state.new_save_buffer() for _ in range(max_ticks)
+        ]
+        self.local_moves = array('d', bytes(8*2*max_ticks))
+        self.remote_moves = array('d', bytes(8*2*max_ticks))
+        self.tick_ms = array('d', bytes(8*max_ticks))
+        self.stats = RollbackStats(max_ticks)
+
+    def advance(self, t: float) -> None:
+        """
+        Rolls back if a late input requires it and simulates the next
+        tick of length `t` ms with the local player's current desired
+        move and the predicted move of the remote player.
+        """
+        if self.rollback_tick is not None:
+            self.rollback()
+        slot = self.current_tick % self.max_ticks
+        self.local_moves[2*slot] = self.local_player.desired_move[0]
+        self.local_moves[2*slot + 1] = self.local_player.desired_move[1]
+        self.remote_moves[2*slot] = self.predicted_move[0]
+        self.remote_moves[2*slot + 1] = self.predicted_move[1]
+        self.tick_ms[slot] = t
+        self.simulate(self.current_tick)
+        self.current_tick += 1
+
+    def add_remote_input(self, tick: int, x: float, y: float) -> None:
+        """
+        Confirms the remote player's desired move for the given tick.
+        Inputs are expected in the order of ticks, ones older than the
+        confirmed tick are ignored.
+        """
+        if tick < self.confirmed_tick:
+            return
+        self.confirmed_tick = tick + 1
+        self.predicted_move[0] = x
+        self.predicted_move[1] = y
+        oldest = self.current_tick - self.max_ticks
+        if tick < oldest:
+            # Can't go back that far, correct what is still saved
+            self.stats.late_inputs += 1
+            tick = max(oldest, 0)
+        # The input replaces the prediction of this tick and the later
+        # ones already simulated
+        for past_tick in range(tick, self.current_tick):
+            slot = past_tick % self.max_ticks
+            if (self.remote_moves[2*slot] != x
+                    or self.remote_moves[2*slot + 1] != y):
+                self.remote_moves[2*slot] = x
+                self.remote_moves[2*slot + 1] = y
+                if self.rollback_tick is None or past_tick < self.rollback_tick:
+                    self.rollback_tick = past_tick
+
+    def rollback(self) -> None:
+        """
+        Loads the state before the earliest mispredicted tick and
+        simulates the ticks up to now again
+        """
+        start = time.perf_counter_ns()
+        first_tick = self.rollback_tick
+        self.rollback_tick = None
+        # The local player's input of the next tick must survive
+        (local_x, local_y) = self.local_player.desired_move
+        self.game_state.load(self.saved_states[first_tick % self.max_ticks])
+        for tick in range(first_tick, self.current_tick):
+            self.simulate(tick)
+        self.local_player.set_desired_move(local_x, local_y)
+        self.stats.add(
+            self.current_tick - first_tick,
+            time.perf_counter_ns() - start,
+            self.budget_ns
+        )
+
+    def simulate(self, tick: int) -> None:
+        """Saves the state before the tick and simulates it"""
+        slot = tick % self.max_ticks
+        self.game_state.save(self.saved_states[slot])
+        self.local_player.set_desired_move(
+            self.local_moves[2*slot],
+            self.local_moves[2*slot + 1]
+        )
+        self.remote_player.set_desired_move(
+            self.remote_moves[2*slot],
+            self.remote_moves[2*slot + 1]
+        )
+        self.game_state.tick_state(self.tick_ms[slot])
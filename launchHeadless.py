@@ -0,0 +1,5 @@
+import sys
+
+import server.headlessEngine
+
+server.headlessEngine.main(sys.argv[1:])
@@ -0,0 +1,7 @@
+import sys
+
+import server.tournament
+
+# Worker processes may import this module, don't start them again
+if __name__ == '__main__':
+    server.tournament.main(sys.argv[1:])
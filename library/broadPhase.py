@@ -0,0 +1,136 @@
+from math import floor
+from typing import Dict, Set, Tuple
+
+import library.constants
+import library.customObjects
+
+
+# Axis-aligned bounding box in form (min x, min y, max x, max y)
+Box = Tuple[float, float, float, float]
+
+
+def entity_box(entity: library.customObjects.Entity) -> Box:
+    """
+    Bounding box of a brick-like entity (its position is the upper left
+    corner)
+    """
+    return (
+        entity.x_pos,
+        entity.y_pos,
+        entity.x_pos + entity.x_scale,
+        entity.y_pos + entity.y_scale
+    )
+
+
+class SpatialHash:
+    """
+    Uniform grid used as the broad phase of collision detection.  Every
+    entity is registered in each cell its bounding box touches, so a
+    query only looks at the entities near the searched area instead of
+    all of them.  Entities are referenced by integer ids.
+    """
+    cell_size: float
+    # Maps cell coordinates to ids of the entities touching the cell
+    cells: Dict[Tuple[int, int], Set[int]]
+    # Range of cells (min x, min y, max x, max y) each entity occupies
+    entity_cells: Dict[int, Tuple[int, int, int, int]]
+    # Range of cells that have ever been occupied, queries are clamped to
+    # it so long sweeps don't walk through empty space
+    bounds: Tuple[int, int, int, int]
+
+    def __init__(
+        self,
+        cell_size: float = library.constants.BROAD_PHASE_CELL_SIZE
+    ):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entity_cells = {}
+        self.bounds = None
+
+    def cell_range(self, box: Box) -> Tuple[int, int, int, int]:
+        """Range of cells (inclusive) covered by the box"""
+        return (
+            floor(box[0] / self.cell_size),
+            floor(box[1] / self.cell_size),
+            floor(box[2] / self.cell_size),
+            floor(box[3] / self.cell_size)
+        )
+
+    def insert(self, entity_id: int, box: Box) -> None:
+        if entity_id in self.entity_cells:
+            raise KeyError("Entity {} is already registered".format(entity_id))
+        cells = self.cell_range(box)
+        self._link(entity_id, cells)
+
+    def remove(self, entity_id: int) -> None:
+        cells = self.entity_cells.pop(entity_id)
+        for x in range(cells[0], cells[2] + 1):
+            for y in range(cells[1], cells[3] + 1):
+                cell = self.cells[(x, y)]
+                cell.discard(entity_id)
+                if not cell:
+                    del self.cells[(x, y)]
+
+    def update(self, entity_id: int, box: Box) -> None:
+        """
+        Moves already registered entity to its new bounding box.  Cheap
+        if it stays within the same cells.
+        """
+        cells = self.cell_range(box)
+        if self.entity_cells[entity_id] == cells:
+            return
+        self.remove(entity_id)
+        self._link(entity_id, cells)
+
+    def query(self, box: Box) -> Set[int]:
+        """
+        Returns ids of the entities which may intersect the box (all
+        entities sharing a cell with it).
+        """
+        found = set()
+        self.query_into(found, box[0], box[1], box[2], box[3])
+        return found
+
+    def query_into(
+        self,
+        found: Set[int],
+        min_x: float,
+        min_y: float,
+        max_x: float,
+        max_y: float
+    ) -> None:
+        """
+        Same as `query`, but takes the box as plain coordinates and
+        fills the given set (cleared first), so a set can be reused
+        between queries instead of allocating a new one.
+        """
+        found.clear()
+        if self.bounds is None:
+            return
+        cell_size = self.cell_size
+        for x in range(max(floor(min_x / cell_size), self.bounds[0]),
+                       min(floor(max_x / cell_size), self.bounds[2]) + 1):
+            for y in range(max(floor(min_y / cell_size), self.bounds[1]),
+                           min(floor(max_y / cell_size), self.bounds[3]) + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    found |= cell
+
+    def _link(
+        self,
+        entity_id: int,
+        cells: Tuple[int, int, int, int]
+    ) -> None:
+        self.entity_cells[entity_id] = cells
+        for x in range(cells[0], cells[2] + 1):
+            for y in range(cells[1], cells[3] + 1):
+                self.cells.setdefault((x, y), set()).add(entity_id)
+        if self.bounds is None:
+            self.bounds = cells
+        else:
+            self.bounds = (
+                min(self.bounds[0], cells[0]),
+                min(self.bounds[1], cells[1]),
+                max(self.bounds[2], cells[2]),
+                max(self.bounds[3], cells[3])
+            )
@@ -0,0 +1,38 @@
+import time
+
+
+class Clock:
+    """
+    Frame rate limiter with the interface of `pygame.time.Clock`, for
+    processes which don't use pygame otherwise (server, bots)
+    """
+    # Time of the previous `tick` call (perf_counter, s)
+    last_tick: float
+    # Milliseconds between the previous 2 `tick` calls
+    frame_ms: float
+
+    def __init__(self):
+        self.last_tick = None
+        self.frame_ms = 0.0
+
+    def tick(self, framerate: float = 0) -> float:
+        """
+        Sleeps so that calls happen no more than `framerate` times per
+        second (unlimited if 0).
+        @returns Milliseconds since the previous call
+        """
+        now = time.perf_counter()
+        if self.last_tick is None:
+            self.last_tick = now
+        if framerate > 0:
+            remaining = self.last_tick + 1/framerate - now
+            if remaining > 0:
+                time.sleep(remaining)
+                now = time.perf_counter()
+        self.frame_ms = (now - self.last_tick) * 1e3
+        self.last_tick = now
+        return self.frame_ms
+
+    def get_time(self) -> float:
+        """Milliseconds between the previous 2 `tick` calls"""
+        return self.frame_ms
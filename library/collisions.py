@@ -1,5 +1,5 @@
-from typing import List, NamedTuple, Tuple, Type
-from math import sqrt
+from typing import List, NamedTuple, Tuple, Type, Union
+from math import sqrt, pi
 import numpy as np
 
 import library.customObjects
@@ -7,6 +7,25 @@ import library.utilities
 import library.constants
 
 
+def movement_time(
+    point: Tuple[float, float],
+    vec_start: Tuple[float, float],
+    vec_end: Tuple[float, float]
+) -> float:
+    """
+    Parametric time at which the movement from `vec_start` to `vec_end`
+    passes the point (which must lie on it), from 0 to 1.  Zero-length
+    movements are at the point right away.
+    """
+    rx = vec_end[0] - vec_start[0]
+    ry = vec_end[1] - vec_start[1]
+    length_sqr = rx*rx + ry*ry
+    if length_sqr == 0:
+        return 0.0
+    t = ((point[0] - vec_start[0])*rx + (point[1] - vec_start[1])*ry) / length_sqr
+    return min(max(t, 0.0), 1.0)
+
+
 def collision_vector_circle(
     vec_start: Tuple[float, float],
     vec_end: Tuple[float, float],
@@ -77,6 +96,7 @@ def collision_vector_circle(
     for point in result_in_segment:
         next_col = library.customObjects.Collision()
         next_col.position = point
+        next_col.time = movement_time(point, vec_start, vec_end)
         # It lies on the circle, so we can easily find normal vector
         normal = (
             point[0] - circ_orig[0],
@@ -97,13 +117,240 @@ def collision_vector_segment(
     Finds collision of a vector into a segment, if any.  If they are
     parallel, empty list is returned.  In case of (partly) coinciding
     segments, collision point closest to a start of segment 1 is given.
+    Dispatches to the scalar or the NumPy implementation depending on
+    `library.constants.USE_NUMPY_COLLISIONS`.
+    @returns List of collisions (0 or 1) with normal - any orthogonal 
+    vector to segment 2
+    """
+    if library.constants.USE_NUMPY_COLLISIONS:
+        return collision_vector_segment_numpy(
+            vec_start, vec_end, seg_start, seg_end
+        )
+    return collision_vector_segment_scalar(
+        vec_start, vec_end, seg_start, seg_end
+    )
+
+
+def collision_vector_segment_scalar(
+    vec_start: Tuple[float, float],
+    vec_end: Tuple[float, float],
+    seg_start: Tuple[float, float],
+    seg_end: Tuple[float, float]
+) -> List[library.customObjects.Collision]:
+    """
+    Same as `collision_vector_segment_numpy`, but solves the
+    intersection parametrically with plain floats (no matrices are
+    allocated).
+    @returns List of collisions (0 or 1) with normal - any orthogonal 
+    vector to segment 2
+    """
+    impact = library.customObjects.Impact()
+    if not impact_vector_segment(
+        vec_start[0], vec_start[1], vec_end[0], vec_end[1],
+        seg_start[0], seg_start[1], seg_end[0], seg_end[1],
+        library.customObjects.NO_ENTITY,
+        impact
+    ):
+        return []
+    col = library.customObjects.Collision()
+    col.position = impact.position
+    col.normal = impact.normal
+    col.time = impact.time
+    return [col]
+
+
+def impact_vector_segment(
+    vec_start_x: float,
+    vec_start_y: float,
+    vec_end_x: float,
+    vec_end_y: float,
+    seg_start_x: float,
+    seg_start_y: float,
+    seg_end_x: float,
+    seg_end_y: float,
+    entity_id: int,
+    impact: library.customObjects.Impact
+) -> bool:
+    """
+    Allocation-free core of `collision_vector_segment_scalar`.  Takes
+    plain coordinates and, if the vector collides into the segment
+    before the given impact, overwrites the impact with the collision.
+    Nothing is allocated unless the impact is updated.
+    @returns Whether the impact was updated
+    """
+    px = vec_start_x
+    py = vec_start_y
+    qx = seg_start_x
+    qy = seg_start_y
+    # Vector is p + t*r, segment is q + u*s
+    rx = vec_end_x - px
+    ry = vec_end_y - py
+    sx = seg_end_x - qx
+    sy = seg_end_y - qy
+    qpx = qx - px
+    qpy = qy - py
+
+    denominator = rx*sy - ry*sx
+    if denominator != 0:
+        # Lines cross at a single point
+        t = (qpx*sy - qpy*sx) / denominator
+        time = min(max(t, 0.0), 1.0)
+        if time >= impact.time:
+            return False
+        x = px + t*rx
+        y = py + t*ry
+        # Coordinates along axis-aligned lines are known exactly, don't
+        # let rounding push the point out of a degenerate box
+        if rx == 0:
+            x = px
+        elif sx == 0:
+            x = qx
+        if ry == 0:
+            y = py
+        elif sy == 0:
+            y = qy
+        if not (library.utilities.in_box(
+                    x, y, px, py, vec_end_x, vec_end_y)
+                and library.utilities.in_box(
+                    x, y, qx, qy, seg_end_x, seg_end_y)):
+            return False
+        # Segment direction rotated by pi/2 is the normal
+        impact.set(time, entity_id, (x, y), (-sy, sx))
+        return True
+
+    # Parallel (or degenerate) lines, check if they coincide by measuring
+    # distance from the segment's start to the vector's line
+    if rx != 0 or ry != 0:
+        (dx, dy) = (rx, ry)
+    else:
+        (dx, dy) = (sx, sy)
+    cross = qpx*dy - qpy*dx
+    if (cross*cross
+            > library.constants.COLLINEAR_MARGIN**2 * (dx*dx + dy*dy)):
+        # They're parallel
+        return False
+
+    # Lines coincide, the collision is the point closest to vecStart
+    vec_start = (px, py)
+    vec_end = (vec_end_x, vec_end_y)
+    seg_start = (qx, qy)
+    seg_end = (seg_end_x, seg_end_y)
+    closest_point = None
+    min_distance = None
+    for point in (vec_start, vec_end, seg_start, seg_end):
+        distance = (point[0] - px)**2 + (point[1] - py)**2
+        if ((min_distance is None or min_distance > distance)
+                and library.utilities.point_in_box(point, vec_start, vec_end)
+                and library.utilities.point_in_box(point, seg_start, seg_end)):
+            min_distance = distance
+            closest_point = point
+    if closest_point is None:
+        return False
+    time = movement_time(closest_point, vec_start, vec_end)
+    if time >= impact.time:
+        return False
+    impact.set(time, entity_id, closest_point, (-sy, sx))
+    return True
+
+
+def impact_vector_circle(
+    vec_start_x: float,
+    vec_start_y: float,
+    vec_end_x: float,
+    vec_end_y: float,
+    circ_orig_x: float,
+    circ_orig_y: float,
+    circ_r: float,
+    box: Tuple[Tuple[float, float], Tuple[float, float]],
+    entity_id: int,
+    impact: library.customObjects.Impact
+) -> bool:
+    """
+    Allocation-free counterpart of `collision_vector_circle`, solved
+    parametrically.  Only intersections inside the `box` (if given)
+    count, like for corners of a stadium.  If the first of them happens
+    before the given impact, the impact is overwritten with it.
+    @returns Whether the impact was updated
+    """
+    rx = vec_end_x - vec_start_x
+    ry = vec_end_y - vec_start_y
+    fx = vec_start_x - circ_orig_x
+    fy = vec_start_y - circ_orig_y
+    # Solve |f + t*r| = circ_r for t
+    a_quad = rx*rx + ry*ry
+    b_quad = 2*(fx*rx + fy*ry)
+    c_quad = fx*fx + fy*fy - circ_r*circ_r
+    if a_quad == 0:
+        # Zero-length vector collides only if it is on the circle
+        if c_quad != 0:
+            return False
+        t_entry = t_exit = 0.0
+    else:
+        det = b_quad*b_quad - 4*a_quad*c_quad
+        if det < 0:
+            return False
+        det_sqrt = sqrt(det)
+        t_entry = (-b_quad - det_sqrt) / (2*a_quad)
+        t_exit = (-b_quad + det_sqrt) / (2*a_quad)
+    # Entry point comes first, so the exit one matters only if the entry
+    # is filtered out
+    if _circle_root_impact(
+        t_entry, vec_start_x, vec_start_y, vec_end_x, vec_end_y,
+        circ_orig_x, circ_orig_y, box, entity_id, impact
+    ):
+        return True
+    return _circle_root_impact(
+        t_exit, vec_start_x, vec_start_y, vec_end_x, vec_end_y,
+        circ_orig_x, circ_orig_y, box, entity_id, impact
+    )
+
+
+def _circle_root_impact(
+    t: float,
+    vec_start_x: float,
+    vec_start_y: float,
+    vec_end_x: float,
+    vec_end_y: float,
+    circ_orig_x: float,
+    circ_orig_y: float,
+    box: Tuple[Tuple[float, float], Tuple[float, float]],
+    entity_id: int,
+    impact: library.customObjects.Impact
+) -> bool:
+    """Checks one solution of `impact_vector_circle`"""
+    time = min(max(t, 0.0), 1.0)
+    if time >= impact.time:
+        return False
+    x = vec_start_x + t*(vec_end_x - vec_start_x)
+    y = vec_start_y + t*(vec_end_y - vec_start_y)
+    # Filter out intersections outside the vector and the box
+    if not library.utilities.in_box(
+            x, y, vec_start_x, vec_start_y, vec_end_x, vec_end_y):
+        return False
+    if box is not None and not library.utilities.in_box(
+            x, y, box[0][0], box[0][1], box[1][0], box[1][1]):
+        return False
+    # It lies on the circle, so we can easily find normal vector
+    impact.set(time, entity_id, (x, y), (x - circ_orig_x, y - circ_orig_y))
+    return True
+
+
+def collision_vector_segment_numpy(
+    vec_start: Tuple[float, float],
+    vec_end: Tuple[float, float],
+    seg_start: Tuple[float, float],
+    seg_end: Tuple[float, float]
+) -> List[library.customObjects.Collision]:
+    """
+    Reference implementation of `collision_vector_segment` based on
+    solving the system of line equations with NumPy.
     @returns List of collisions (0 or 1) with normal - any orthogonal 
     vector to segment 2
     """
     # Find the normal right away
     # Doesn't matter which side of the segment the normal should face
     normal: np.ndarray = (
-        library.utilities.rotation_matrix_2d(np.math.pi/2)
+        library.utilities.rotation_matrix_2d(pi/2)
         @ np.array([seg_end[0]-seg_start[0], seg_end[1]-seg_start[1]]))
     # Evaluate formulae for lines for segment and vector in form of
     # ax + by = c
@@ -123,6 +370,7 @@ def collision_vector_segment(
             col = library.customObjects.Collision()
             col.position = (solution[0], solution[1])
             col.normal = (normal[0], normal[1])
+            col.time = movement_time(col.position, vec_start, vec_end)
             return [col]
         else:
             return []
@@ -175,6 +423,7 @@ def collision_vector_segment(
                 col = library.customObjects.Collision()
                 col.position = (closest_point[0], closest_point[1])
                 col.normal = (normal[0], normal[1])
+                col.time = movement_time(col.position, vec_start, vec_end)
                 return [col]
 
 
@@ -296,6 +545,110 @@ def brick_ball_to_stadium(
     )
 
 
+class StadiumGeometry(NamedTuple):
+    """Stadium of a brick together with lists used to check collisions"""
+    stadium: Stadium
+    # Bounding box of the whole stadium (min x, min y, max x, max y)
+    box: Tuple[float, float, float, float]
+    # In the order LEFT, RIGHT, TOP, BOTTOM
+    sides: Tuple[Tuple[Tuple[float, float], Tuple[float, float]], ...]
+    # In the order LEFT TOP, RIGHT TOP, LEFT BOTTOM, RIGHT BOTTOM
+    corners: Tuple[Tuple[Tuple[float, float], float], ...]
+    corner_boxes: Tuple[Tuple[Tuple[float, float], Tuple[float, float]], ...]
+
+
+def get_stadium_geometry(
+    ball: library.customObjects.Ball,
+    brick: Type[library.customObjects.Brick]
+) -> StadiumGeometry:
+    """
+    Same as `brick_ball_to_stadium`, but memoized inside the brick.  The
+    stadium is rebuilt only if the brick has moved (its version has
+    changed) or the radius of the ball is different.
+    """
+    key = (brick.version, ball.x_scale)
+    if brick.stadium_cache_key != key:
+        stadium = brick_ball_to_stadium(ball, brick)
+        brick.stadium_cache = StadiumGeometry(
+            stadium=stadium,
+            box=(
+                brick.x_pos - ball.x_scale,
+                brick.y_pos - ball.x_scale,
+                brick.x_pos + brick.x_scale + ball.x_scale,
+                brick.y_pos + brick.y_scale + ball.x_scale
+            ),
+            sides=(
+                stadium.left_side,
+                stadium.right_side,
+                stadium.top_side,
+                stadium.bottom_side
+            ),
+            corners=(
+                stadium.left_top_corner,
+                stadium.right_top_corner,
+                stadium.left_bottom_corner,
+                stadium.right_bottom_corner
+            ),
+            corner_boxes=(
+                stadium.left_top_corner_box,
+                stadium.right_top_corner_box,
+                stadium.left_bottom_corner_box,
+                stadium.right_bottom_corner_box
+            )
+        )
+        brick.stadium_cache_key = key
+    return brick.stadium_cache
+
+
+class RejectionCounters:
+    """
+    Counts how often the cheap bounding box test lets a collision check
+    skip the exact (narrow phase) tests
+    """
+    checked: int
+    rejected: int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checked = 0
+        self.rejected = 0
+
+    def reject_rate(self) -> float:
+        if self.checked == 0:
+            return 0.0
+        return self.rejected / self.checked
+
+
+# Counters of `collision_ball_brick`
+ball_brick_counters = RejectionCounters()
+
+
+def _misses_stadium_box(
+    geometry: StadiumGeometry,
+    start_x: float,
+    start_y: float,
+    end_x: float,
+    end_y: float
+) -> bool:
+    """
+    The movement can't hit the stadium if its bounding box doesn't
+    overlap the stadium's one (with the same margin as `point_in_box`).
+    Updates `ball_brick_counters`.
+    """
+    ball_brick_counters.checked += 1
+    box = geometry.box
+    margin = library.constants.ERROR_MARGIN
+    if (max(start_x, end_x) < box[0] - margin
+            or min(start_x, end_x) > box[2] + margin
+            or max(start_y, end_y) < box[1] - margin
+            or min(start_y, end_y) > box[3] + margin):
+        ball_brick_counters.rejected += 1
+        return True
+    return False
+
+
 def collision_ball_brick(
     ball: library.customObjects.Ball,
     brick: Type[library.customObjects.Brick],
@@ -312,31 +665,24 @@ def collision_ball_brick(
     # being the same as of the ball), such that the stadium is thicker
     # than brick by the radius of the ball
     #
-    # With this knowledge, let's find the stadium's properties
-    stadium = brick_ball_to_stadium(ball, brick)
-    s_sides = [
-        stadium.left_side,
-        stadium.right_side,
-        stadium.top_side,
-        stadium.bottom_side
-    ]
-    s_corners = [
-        stadium.left_top_corner,
-        stadium.right_top_corner,
-        stadium.left_bottom_corner,
-        stadium.right_bottom_corner
-    ]
-    s_corner_boxes = [
-        stadium.left_top_corner_box,
-        stadium.right_top_corner_box,
-        stadium.left_bottom_corner_box,
-        stadium.right_bottom_corner_box
-    ]
-
+    # With this knowledge, let's find the stadium's properties (they are
+    # cached while the brick stays in place)
+    geometry = get_stadium_geometry(ball, brick)
     movement_end = (
         movement_start[0] + movement_vec[0],
         movement_start[1] + movement_vec[1]
     )
+
+    if _misses_stadium_box(
+        geometry,
+        movement_start[0], movement_start[1],
+        movement_end[0], movement_end[1]
+    ):
+        return []
+
+    s_sides = geometry.sides
+    s_corners = geometry.corners
+    s_corner_boxes = geometry.corner_boxes
     collisions: List[library.customObjects.Collision] = []
     # Check collisions with sides
     for side in s_sides:
@@ -361,27 +707,74 @@ def collision_ball_brick(
     return collisions
 
 
+def impact_ball_brick(
+    ball: library.customObjects.Ball,
+    brick: Type[library.customObjects.Brick],
+    movement_start_x: float,
+    movement_start_y: float,
+    movement_vec_x: float,
+    movement_vec_y: float,
+    entity_id: int,
+    impact: library.customObjects.Impact
+) -> bool:
+    """
+    Allocation-free counterpart of `collision_ball_brick`.  If the ball
+    moving into the brick collides with it before the given impact, the
+    impact is overwritten with the first collision.
+    @returns Whether the impact was updated
+    """
+    geometry = get_stadium_geometry(ball, brick)
+    end_x = movement_start_x + movement_vec_x
+    end_y = movement_start_y + movement_vec_y
+    if _misses_stadium_box(
+        geometry, movement_start_x, movement_start_y, end_x, end_y
+    ):
+        return False
+
+    updated = False
+    sides = geometry.sides
+    for i in range(4):
+        side = sides[i]
+        if impact_vector_segment(
+            movement_start_x, movement_start_y, end_x, end_y,
+            side[0][0], side[0][1], side[1][0], side[1][1],
+            entity_id, impact
+        ):
+            updated = True
+    corners = geometry.corners
+    corner_boxes = geometry.corner_boxes
+    for i in range(4):
+        corner = corners[i]
+        if impact_vector_circle(
+            movement_start_x, movement_start_y, end_x, end_y,
+            corner[0][0], corner[0][1], corner[1],
+            corner_boxes[i],
+            entity_id, impact
+        ):
+            updated = True
+    return updated
+
+
 def resolve_collision(
     start_pos: Tuple[float, float],
     move_vec: Tuple[float, float],
-    collision: library.customObjects.Collision
+    collision: Union[
+        library.customObjects.Collision,
+        library.customObjects.Impact
+    ]
 ) -> Tuple[float, float]:
     """
-    Calculates remaining move vector given the move and collision.  
-    Note that collision must lie within the given movement.
+    Calculates remaining move vector given the move and collision (or
+    impact) found along it.  The part of the move left after the
+    collision is known from its time, so `start_pos` isn't needed
+    anymore and is kept for compatibility.
     @returns New move vector (to be applied from collision position)
     """
-    move_np: np.ndarray = np.array(move_vec)
-    move_to_collision_np: np.ndarray = np.array(
-        collision.position) - np.array(start_pos)
-    remaining_move_np: np.ndarray = move_np - move_to_collision_np
-    remaining_move_np = np.array(
-        library.utilities.mirror_vector_2d(
-            remaining_move_np,
-            collision.normal
-        )
+    remaining = 1.0 - collision.time
+    return library.utilities.mirror_vector_2d(
+        (move_vec[0]*remaining, move_vec[1]*remaining),
+        collision.normal
     )
-    return remaining_move_np
 
 
 def get_closest_collision(
@@ -389,22 +782,307 @@ def get_closest_collision(
     collisions: List[library.customObjects.Collision]
 ) -> Tuple[library.customObjects.Collision, int]:
     """
-    Returns closest collision from the provided list to the given point,
-    as well as its index in the list.  If empty list is recieved, None
-    is returned
+    Returns collision from the provided list that happens first along
+    the movement they were found for (the one closest to its start
+    `point`), as well as its index in the list.  If empty list is
+    recieved, None is returned
     """
-    collisions_dist = [
-        library.utilities.distance(point, col.position) for col in collisions
-    ]
     if len(collisions) > 0:
         closest_collision = collisions[0]
         closest_collision_index = 0
-        minDist = collisions_dist[0]
         for i in range(1, len(collisions)):
-            if collisions_dist[i] < minDist:
+            if collisions[i].time < closest_collision.time:
                 closest_collision = collisions[i]
                 closest_collision_index = i
-                minDist = collisions_dist[i]
         return (closest_collision, closest_collision_index)
     else:
         return None
+
+
+def earliest_impact(
+    collisions: List[library.customObjects.Collision],
+    entity_id: int,
+    current: library.customObjects.Impact = None
+) -> library.customObjects.Impact:
+    """
+    Picks the first of the collisions with the entity, if it happens
+    before the `current` impact (if any).  Meant to be folded over all
+    entities along a movement.  Ties are resolved in favor of the
+    impact found first.
+    @returns The earliest impact, or None if there are none
+    """
+    for collision in collisions:
+        if current is None or collision.time < current.time:
+            current = library.customObjects.Impact(
+                collision.time,
+                entity_id,
+                collision.position,
+                collision.normal
+            )
+    return current
+
+
+class BatchCollisions(NamedTuple):
+    """
+    Collisions of N movements against M obstacles, found in one go.
+    Every field is indexed by (movement, obstacle).
+    """
+    # Whether the movement collides with the obstacle
+    hit: np.ndarray             # (N, M), bool
+    # Parametric time of the collision along the movement, in [0, 1].
+    # `inf` where there is no hit
+    time: np.ndarray            # (N, M)
+    # Meaningful only where `hit` is set
+    position: np.ndarray        # (N, M, 2)
+    normal: np.ndarray          # (N, M, 2)
+
+
+def _batch_movements(
+    vec_starts: np.ndarray,
+    vec_ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts (N, 2) arrays of movements' starts and ends into start
+    points and movement vectors of shape (N, 1, 2), ready to be
+    broadcast against obstacles.
+    """
+    p = np.asarray(vec_starts, dtype=float)[:, None, :]
+    r = np.asarray(vec_ends, dtype=float)[:, None, :] - p
+    return (p, r)
+
+
+def _batch_in_box(
+    points: np.ndarray,
+    box_corners_1: np.ndarray,
+    box_corners_2: np.ndarray
+) -> np.ndarray:
+    """
+    Vectorized `library.utilities.in_box` for arrays of points and box
+    corners (last axis being x and y), with the same margin
+    """
+    box_min = np.minimum(box_corners_1, box_corners_2)
+    box_max = np.maximum(box_corners_1, box_corners_2)
+    margin = library.constants.ERROR_MARGIN
+    return ((box_min[..., 0] - margin <= points[..., 0])
+            & (points[..., 0] <= box_max[..., 0] + margin)
+            & (box_min[..., 1] <= points[..., 1])
+            & (points[..., 1] <= box_max[..., 1]))
+
+
+def batch_collision_vector_segment(
+    vec_starts: np.ndarray,
+    vec_ends: np.ndarray,
+    seg_starts: np.ndarray,
+    seg_ends: np.ndarray
+) -> BatchCollisions:
+    """
+    Vectorized version of `collision_vector_segment` for N movements
+    (arrays of shape (N, 2)) and M segments (arrays of shape (M, 2), or
+    (N, M, 2) for segments specific to each movement).  Zero-length
+    movements never collide.
+    @returns Collisions of shape (N, M).  Normals are segments rotated by
+    pi/2, as in the scalar version
+    """
+    (p, r) = _batch_movements(vec_starts, vec_ends)
+    q = np.asarray(seg_starts, dtype=float)
+    s = np.asarray(seg_ends, dtype=float) - q
+    qp = q - p
+    denominator = r[..., 0]*s[..., 1] - r[..., 1]*s[..., 0]
+    qp_cross_s = qp[..., 0]*s[..., 1] - qp[..., 1]*s[..., 0]
+    qp_cross_r = qp[..., 0]*r[..., 1] - qp[..., 1]*r[..., 0]
+    margin = library.constants.ERROR_MARGIN
+
+    # Lines crossing at a single point
+    crossing = denominator != 0
+    safe_denominator = np.where(crossing, denominator, 1.0)
+    t = qp_cross_s / safe_denominator
+    crossing_point = p + t[..., None]*r
+    # Coordinates along axis-aligned lines are known exactly (as in the
+    # scalar version)
+    crossing_point = np.where(
+        r == 0, p, np.where(s == 0, q, crossing_point)
+    )
+    hit = (crossing
+           & _batch_in_box(crossing_point, p, p + r)
+           & _batch_in_box(crossing_point, q, q + s))
+    time = np.where(hit, np.clip(t, 0.0, 1.0), np.inf)
+
+    # Coinciding lines, the collision is the start of their overlap
+    r_sqr = np.sum(r*r, axis=-1)
+    safe_r_sqr = np.where(r_sqr > 0, r_sqr, 1.0)
+    collinear = (~crossing
+                 & (r_sqr > 0)
+                 & (qp_cross_r**2
+                    <= library.constants.COLLINEAR_MARGIN**2 * r_sqr))
+    t_seg_start = np.sum(qp*r, axis=-1) / safe_r_sqr
+    t_seg_end = np.sum((qp + s)*r, axis=-1) / safe_r_sqr
+    overlap_start = np.maximum(np.minimum(t_seg_start, t_seg_end), 0.0)
+    overlap_end = np.minimum(np.maximum(t_seg_start, t_seg_end), 1.0)
+    overlapping = collinear & (overlap_start <= overlap_end + margin)
+    time = np.where(overlapping, overlap_start, time)
+    hit = hit | overlapping
+
+    safe_time = np.where(hit, time, 0.0)
+    position = np.where(
+        (crossing & hit)[..., None],
+        crossing_point,
+        p + safe_time[..., None]*r
+    )
+    normal = np.stack(
+        np.broadcast_arrays(-s[..., 1], s[..., 0]),
+        axis=-1
+    )
+    normal = np.broadcast_to(normal, position.shape)
+    return BatchCollisions(hit, time, position, normal)
+
+
+def batch_collision_vector_circle(
+    vec_starts: np.ndarray,
+    vec_ends: np.ndarray,
+    circ_origs: np.ndarray,
+    circ_radii: np.ndarray,
+    circ_boxes: np.ndarray = None
+) -> BatchCollisions:
+    """
+    Vectorized version of `collision_vector_circle` for N movements
+    (arrays of shape (N, 2)) and M circles (origins of shape (M, 2) and
+    radii of shape (M,), or with leading N axis).  Only the first
+    intersection along each movement is reported.  If `circ_boxes` of
+    shape (M, 2, 2) is given, only intersections inside the
+    corresponding box count (as with corners of a stadium).  Zero-length
+    movements never collide.
+    @returns Collisions of shape (N, M).  Normals are vectors from the
+    origin of the circle to the collision
+    """
+    (p, r) = _batch_movements(vec_starts, vec_ends)
+    c = np.asarray(circ_origs, dtype=float)
+    radii = np.asarray(circ_radii, dtype=float)
+    f = p - c
+    # Solve |f + t*r| = radius for t
+    a_quad = np.sum(r*r, axis=-1)
+    b_quad = 2*np.sum(f*r, axis=-1)
+    c_quad = np.sum(f*f, axis=-1) - radii**2
+    det = b_quad**2 - 4*a_quad*c_quad
+    solvable = (a_quad > 0) & (det >= 0)
+    det_sqrt = np.sqrt(np.where(solvable, det, 0.0))
+    safe_a_quad = np.where(solvable, a_quad, 1.0)
+
+    time = np.full(det.shape, np.inf)
+    # Check the exit root first, so the entry one overrides it
+    for sign in (1.0, -1.0):
+        t = (-b_quad + sign*det_sqrt) / (2*safe_a_quad)
+        point = p + t[..., None]*r
+        valid = solvable & _batch_in_box(point, p, p + r)
+        if circ_boxes is not None:
+            boxes = np.asarray(circ_boxes, dtype=float)
+            valid &= _batch_in_box(point, boxes[..., 0, :], boxes[..., 1, :])
+        time = np.where(valid, np.clip(t, 0.0, 1.0), time)
+
+    hit = np.isfinite(time)
+    safe_time = np.where(hit, time, 0.0)
+    position = p + safe_time[..., None]*r
+    normal = position - c
+    return BatchCollisions(hit, time, position, normal)
+
+
+def stadiums_to_arrays(
+    stadiums: List[Stadium]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Packs sides and corners of the stadiums into arrays for batch
+    collision functions.  Each stadium takes 4 consecutive rows, in the
+    same order as `collision_ball_brick` checks them.
+    @returns Tuple (side starts, side ends, corner origins, corner radii,
+    corner boxes)
+    """
+    side_starts, side_ends = [], []
+    corner_origs, corner_radii, corner_boxes = [], [], []
+    for stadium in stadiums:
+        for side in (
+            stadium.left_side,
+            stadium.right_side,
+            stadium.top_side,
+            stadium.bottom_side
+        ):
+            side_starts.append(side[0])
+            side_ends.append(side[1])
+        for (corner, box) in (
+            (stadium.left_top_corner, stadium.left_top_corner_box),
+            (stadium.right_top_corner, stadium.right_top_corner_box),
+            (stadium.left_bottom_corner, stadium.left_bottom_corner_box),
+            (stadium.right_bottom_corner, stadium.right_bottom_corner_box)
+        ):
+            corner_origs.append(corner[0])
+            corner_radii.append(corner[1])
+            corner_boxes.append(box)
+    return (
+        np.array(side_starts, dtype=float).reshape(-1, 2),
+        np.array(side_ends, dtype=float).reshape(-1, 2),
+        np.array(corner_origs, dtype=float).reshape(-1, 2),
+        np.array(corner_radii, dtype=float),
+        np.array(corner_boxes, dtype=float).reshape(-1, 2, 2)
+    )
+
+
+def batch_earliest(
+    collisions: BatchCollisions,
+    group_size: int
+) -> BatchCollisions:
+    """
+    Reduces each consecutive group of `group_size` obstacles to the
+    collision happening first along the movement (ties are resolved in
+    favor of the first obstacle in the group).
+    @returns Collisions of shape (N, M/group_size)
+    """
+    (n, m) = collisions.time.shape
+    time = collisions.time.reshape(n, m // group_size, group_size)
+    first = np.argmin(time, axis=-1)[..., None]
+    position = collisions.position.reshape(n, m // group_size, group_size, 2)
+    normal = collisions.normal.reshape(n, m // group_size, group_size, 2)
+    time = np.take_along_axis(time, first, axis=-1)[..., 0]
+    return BatchCollisions(
+        np.isfinite(time),
+        time,
+        np.take_along_axis(position, first[..., None], axis=-2)[..., 0, :],
+        np.take_along_axis(normal, first[..., None], axis=-2)[..., 0, :]
+    )
+
+
+def batch_collision_ball_brick(
+    ball: library.customObjects.Ball,
+    bricks: List[library.customObjects.Brick],
+    movement_starts: np.ndarray,
+    movement_ends: np.ndarray
+) -> BatchCollisions:
+    """
+    Vectorized version of `collision_ball_brick` for N movements of the
+    ball (arrays of shape (N, 2)) against each of the given bricks.
+    @returns Collisions of shape (N, len(bricks)), earliest one for
+    each pair of movement and brick
+    """
+    n = len(movement_starts)
+    (side_starts, side_ends, corner_origs, corner_radii, corner_boxes) = (
+        stadiums_to_arrays(
+            [get_stadium_geometry(ball, brick).stadium for brick in bricks]
+        )
+    )
+    sides = batch_collision_vector_segment(
+        movement_starts, movement_ends, side_starts, side_ends
+    )
+    corners = batch_collision_vector_circle(
+        movement_starts, movement_ends, corner_origs, corner_radii,
+        corner_boxes
+    )
+    # Put sides and corners of each brick next to each other (sides
+    # first, like the scalar version does) and pick the earliest
+    combined = BatchCollisions(*(
+        np.concatenate(
+            (
+                np.reshape(side_field, (n, -1, 4) + side_field.shape[2:]),
+                np.reshape(corner_field, (n, -1, 4) + corner_field.shape[2:])
+            ),
+            axis=2
+        ).reshape((n, -1) + side_field.shape[2:])
+        for (side_field, corner_field) in zip(sides, corners)
+    ))
+    return batch_earliest(combined, 8)
@@ -13,6 +13,35 @@ BALL_RADIUS = 10
 BALL_STARTING_POS = (250.0, 150.0)
 BALL_STARTING_SPEED = (-1.0, 1.0)
 TICK_RATE_LIMIT = 60
+# Simulate physics with steps of fixed length (in ms) rather than with
+# the time of each frame
+FIXED_TIMESTEP = True
+PHYSICS_STEP_MS = 1000 / 120
+# Maximum number of steps simulated to catch up after a slow frame
+PHYSICS_MAX_STEPS_PER_FRAME = 8
+# Number of past ticks which can be re-simulated when a late input of
+# the remote player arrives (older inputs are applied from now on only)
+ROLLBACK_MAX_TICKS = 8
+# Time a rollback may take before it is counted as over the frame budget
+ROLLBACK_FRAME_BUDGET_MS = 1000 / TICK_RATE_LIMIT / 2
+# The server's scheduler sleeps until this long before each tick and
+# spins for the rest, longer windows burn more CPU but wake up on time
+# even with a coarse OS timer
+SCHEDULER_SPIN_WINDOW_MS = 1.0
+# Deadlines missed by more than this many ticks are skipped
+SCHEDULER_MAX_LAG_TICKS = 4
+
+# Headless matches (bot evaluation and balance testing)
+HEADLESS_SCORE_LIMIT = 5
+# Matches are stopped after this number of ticks even if nobody won
+HEADLESS_MAX_TICKS = 200000
+# Maximum move of a paddle per tick for generated inputs
+HEADLESS_PADDLE_SPEED = 3.0
+# Number of matches sent to a worker process at once by tournaments
+TOURNAMENT_SHARD_SIZE = 4
+# Maximum number of bounces of a ball resolved in one tick by the
+# batched game state (the rest of the move is then taken as it is)
+BATCHED_MAX_BOUNCES = 16
 
 ###################
 # TECHNICAL STUFF #
@@ -33,12 +62,35 @@ SCORE_FONT_COLOR = (255, 255, 255)
 SCORE_OFFSET = 5
 SCORE_DELIMITER = ':'
 
+# Profiling of running processes, see `library.profiling`.  The
+# variable holds a number of ticks to profile from the start (or
+# "START:COUNT"), the signal profiles the following ticks
+PROFILE_ENV_VAR = 'PONG_PROFILE_TICKS'
+PROFILE_SIGNAL = 'SIGUSR1'
+PROFILE_SIGNAL_TICKS = 600
+PROFILE_DIR = 'profiles'
+
+# Number of the latest inputs sent in each input message, an input is
+# lost only when this many packets in a row are
+INPUT_REDUNDANCY = 4
+# Number of sent (and received) snapshots kept as bases of snapshot
+# deltas.  A client which hasn't acknowledged any of them gets a full
+# snapshot
+SNAPSHOT_HISTORY_SIZE = 32
+
+# Size of a cell of the grid used to find bricks near the ball
+BROAD_PHASE_CELL_SIZE = 50
+
 # Error allowed for pointInBox function (to account for computing
 # imprecisions e.g. in matrix operations)
 ERROR_MARGIN = 1e-10
+# Maximum distance between parallel lines for them to be considered
+# coinciding
+COLLINEAR_MARGIN = 1e-5
+# Use the NumPy (matrix based) implementation of segment collisions
+# instead of the scalar one.  Kept for comparison and benchmarking
+USE_NUMPY_COLLISIONS = False
 
 class GameStatus(Enum):
     PAUSE = 0
     RUNNING = 1
-
-WELCOME_MESSAGE = "Hello, I want to play!"
\ No newline at end of file
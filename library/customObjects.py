@@ -1,7 +1,5 @@
-from typing import Tuple, List
-from abc import ABC, abstractmethod
-
-import client.fieldRender
+from math import inf
+from typing import Any, Tuple, List
 
 
 class MovableObject:
@@ -9,27 +7,47 @@ class MovableObject:
     y_pos: float
     x_vel: float
     y_vel: float
+    # Incremented on every change of the position, so anything derived
+    # from it can be cached.  Assigning to `x_pos`/`y_pos` directly
+    # bypasses it, use `move_by`/`moveTo` instead
+    version: int
 
     def __init__(self):
         self.x_pos, self.y_pos = 0.0, 0.0
         self.x_vel, self.y_vel = 0.0, 0.0
+        self.version = 0
 
     def move_by(self, x_move, y_move):
+        if x_move == 0 and y_move == 0:
+            return
         self.x_pos += x_move
         self.y_pos += y_move
+        self.version += 1
 
     def moveTo(self, x_new, y_new):
+        if x_new == self.x_pos and y_new == self.y_pos:
+            return
         self.x_pos = x_new
         self.y_pos = y_new
+        self.version += 1
 
     def __iter__(self):
         yield self.x_pos
         yield self.y_pos
 
 
+# Entity id meaning "nothing"
+NO_ENTITY = -1
+
+
 class Collision:
+    __slots__ = ('position', 'normal', 'time')
+
     position: Tuple[float, float]
     normal: Tuple[float, float]
+    # Parametric time of the collision along the checked movement, from
+    # 0 (its start) to 1 (its end)
+    time: float
 
     def get_unit_normal(self) -> Tuple[float, float]:
         magnitude = (self.normal[0]**2 + self.normal[1]**2)**0.5
@@ -39,6 +57,48 @@ class Collision:
         )
 
 
+class Impact:
+    """
+    The first collision along a movement together with the entity it
+    happens with.  Impacts are compared by their time only, so the
+    closest one is found without computing any distances.  Can be
+    reused as a scratch buffer with `reset` and `set`.
+    """
+    __slots__ = ('time', 'entity_id', 'position', 'normal')
+
+    # Parametric time of the collision along the movement, in [0, 1].
+    # Infinite if nothing is found yet
+    time: float
+    entity_id: int
+    position: Tuple[float, float]
+    normal: Tuple[float, float]
+
+    def __init__(
+            self,
+            time: float = inf,
+            entity_id: int = NO_ENTITY,
+            position: Tuple[float, float] = None,
+            normal: Tuple[float, float] = None):
+        self.set(time, entity_id, position, normal)
+
+    def set(
+            self,
+            time: float,
+            entity_id: int,
+            position: Tuple[float, float],
+            normal: Tuple[float, float]) -> None:
+        self.time = time
+        self.entity_id = entity_id
+        self.position = position
+        self.normal = normal
+
+    def reset(self) -> None:
+        self.time = inf
+        self.entity_id = NO_ENTITY
+        self.position = None
+        self.normal = None
+
+
 class Entity(MovableObject):
     color: Tuple[int, int, int]
     x_scale: float
@@ -50,10 +110,6 @@ class Entity(MovableObject):
         self.x_scale = 1.0
         self.y_scale = 1.0
 
-    @abstractmethod
-    def draw(self, renderer: client.fieldRender.PlayingFieldRenderer):
-        pass
-
 
 class Ball(Entity):
     def __init__(
@@ -71,15 +127,13 @@ class Ball(Entity):
         self.y_scale = scale
         self.color = color
 
-    def draw(self, renderer: client.fieldRender.PlayingFieldRenderer):
-        renderer.draw_circle(
-            self.color,
-            (self.x_pos, self.y_pos),
-            self.x_scale
-        )
-
 
 class Brick(Entity):
+    # (version, ball radius) the cached stadium was built for
+    stadium_cache_key: Tuple[int, float]
+    # See `library.collisions.get_stadium_geometry`
+    stadium_cache: Any
+
     def __init__(
             self,
             x: float = 0.0,
@@ -95,17 +149,8 @@ class Brick(Entity):
         self.x_scale = x_scale
         self.y_scale = y_scale
         self.color = color
-
-    def draw(self, renderer: client.fieldRender.PlayingFieldRenderer):
-        renderer.draw_rect(
-            self.color,
-            (
-                self.x_pos,
-                self.y_pos,
-                self.x_scale,
-                self.y_scale
-            )
-        )
+        self.stadium_cache_key = None
+        self.stadium_cache = None
 
 
 class Player(Brick):
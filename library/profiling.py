@@ -0,0 +1,141 @@
+from typing import Tuple
+import cProfile
+import os
+import signal
+
+import library.constants
+
+
+def parse_profile_request(value: str) -> Tuple[int, int]:
+    """
+    Parses the value of the profiling environment variable, either
+    "COUNT" (profile the first COUNT ticks) or "START:COUNT".
+    @returns Tuple (first tick, number of ticks)
+    """
+    if ':' in value:
+        (start, count) = value.split(':', 1)
+        return (int(start), int(count))
+    return (0, int(value))
+
+
+class TickProfiler:
+    """
+    Runs cProfile over a range of ticks of a process's main loop, so a
+    running process can be profiled without restarting it under a
+    profiler.  Profiling is requested by the environment variable
+    `PROFILE_ENV_VAR` at start, or at any time by sending the signal
+    `PROFILE_SIGNAL` (profiles the next `PROFILE_SIGNAL_TICKS` ticks).
+    Results are written as `<role>-<pid>-ticks<first>-<last>.pstats`.
+
+    The loop must call `tick` once per iteration, which is nearly free
+    while nothing is being profiled.
+    """
+    role: str
+    output_dir: str
+    # Number of the next tick
+    tick_number: int
+    # Requested range of ticks, None if there is no request
+    start_tick: int
+    end_tick: int
+    # Ticks to be profiled after the signal arrives, the handler only
+    # sets this, the profiler is started by `tick`
+    signal_request: int
+    profiler: cProfile.Profile
+    # Tick the running profile started at
+    profile_start: int
+
+    def __init__(
+        self,
+        role: str,
+        output_dir: str = library.constants.PROFILE_DIR,
+        install_signal: bool = True
+    ):
+        self.role = role
+        self.output_dir = output_dir
+        self.tick_number = 0
+        self.start_tick = None
+        self.end_tick = None
+        self.signal_request = 0
+        self.profiler = None
+        self.profile_start = None
+        request = os.environ.get(library.constants.PROFILE_ENV_VAR)
+        if request:
+            (start, count) = parse_profile_request(request)
+            self.request(count, start)
+        if install_signal:
+            self.install_signal_handler()
+
+    def install_signal_handler(self) -> bool:
+        """
+        Makes the profiling signal start profiling.  Works only on
+        platforms having the signal and from the main thread.
+        @returns Whether the handler was installed
+        """
+        signal_number = getattr(signal, library.constants.PROFILE_SIGNAL, None)
+        if signal_number is None:
+            return False
+        try:
+            signal.signal(signal_number, self._on_signal)
+        except ValueError:
+            # Not the main thread
+            return False
+        return True
+
+    def _on_signal(self, signal_number, frame) -> None:
+        self.signal_request = library.constants.PROFILE_SIGNAL_TICKS
+
+    def request(self, count: int, start: int = None) -> None:
+        """
+        Profiles `count` ticks starting at the given tick (the next one
+        by default).  Ignored while a profile is running.
+        """
+        if self.profiler is not None or count <= 0:
+            return
+        if start is None:
+            start = self.tick_number
+        self.start_tick = start
+        self.end_tick = start + count
+
+    def tick(self) -> None:
+        """Must be called at the start of every tick"""
+        if self.signal_request:
+            self.request(self.signal_request)
+            self.signal_request = 0
+        if self.start_tick is not None:
+            if self.profiler is not None and self.tick_number >= self.end_tick:
+                self.stop()
+            elif self.profiler is None and self.tick_number >= self.start_tick:
+                self.start()
+        self.tick_number += 1
+
+    def start(self) -> None:
+        self.profile_start = self.tick_number
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self) -> str:
+        """
+        Stops profiling and writes the results
+        @returns Path of the written file
+        """
+        self.profiler.disable()
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir,
+            "{}-{}-ticks{}-{}.pstats".format(
+                self.role,
+                os.getpid(),
+                self.profile_start,
+                self.tick_number - 1
+            )
+        )
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        self.start_tick = None
+        self.end_tick = None
+        return path
+
+    def close(self) -> None:
+        """Writes the profile cut short by the end of the loop, if any"""
+        if self.profiler is not None:
+            self.stop()
@@ -0,0 +1,341 @@
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Dict, List, NamedTuple, Tuple, Type, Union
+import struct
+
+import library.constants
+
+
+# Every message starts with the protocol version, the message type and
+# the id of the room (match) it belongs to, followed by the fields of
+# its type.  Messages are little-endian and
+# have a fixed size (except snapshot deltas and inputs, whose sizes
+# depend on the fields and inputs they contain), a datagram holds
+# exactly one message.
+PROTOCOL_VERSION = 5
+HEADER = struct.Struct('<BBH')
+# Room id of handshakes which let the server choose the room
+ANY_ROOM = 0xFFFF
+# Sent by clients in the handshake, so that stray datagrams aren't
+# taken for players
+HANDSHAKE_MAGIC = b'PONG'
+
+
+class MessageType(IntEnum):
+    HANDSHAKE = 0
+    INPUT = 1
+    SNAPSHOT = 2
+    SCORE = 3
+    SNAPSHOT_DELTA = 4
+    WELCOME = 5
+
+
+class ProtocolError(ValueError):
+    """Datagram which isn't a valid message of this protocol version"""
+
+
+class Handshake(NamedTuple):
+    magic: bytes = HANDSHAKE_MAGIC
+    # Token of the session to reconnect to, 0 for a new session
+    token: int = 0
+
+
+class Welcome(NamedTuple):
+    """Server's answer to a handshake, in the room of the session"""
+    # Token to reconnect with, e.g. after the client's address changed
+    token: int
+    player_index: int
+
+
+class InputMessage(NamedTuple):
+    """
+    Latest inputs of a client.  Each packet repeats the inputs sent
+    before, so that a lost packet doesn't lose them.
+    """
+    # Tick of the latest snapshot the client has seen, acknowledges it
+    # as a base for snapshot deltas
+    tick: int
+    # Sequence number of the last of the inputs, the others precede it
+    sequence: int
+    # Positions the player wants its paddle to move to, oldest first
+    inputs: Tuple[float, ...]
+
+
+class Snapshot(NamedTuple):
+    tick: int
+    ball_x: float
+    ball_y: float
+    ball_x_vel: float
+    ball_y_vel: float
+    # Paddles move only vertically, their x positions are fixed
+    player_y: float
+    enemy_y: float
+    player_score: int
+    enemy_score: int
+
+
+class SnapshotDelta(NamedTuple):
+    """
+    Snapshot given by the fields which changed since an older snapshot
+    (the base).  Bit i of `changed` is set when the snapshot's field
+    i + 1 (counting from the tick) changed, `values` holds those in
+    order.
+    """
+    tick: int
+    base_tick: int
+    changed: int
+    values: Tuple
+
+
+class ScoreEvent(NamedTuple):
+    # Tick at which the goal was scored
+    tick: int
+    player_score: int
+    enemy_score: int
+
+
+Message = Union[
+    Handshake, Welcome, InputMessage, Snapshot, ScoreEvent, SnapshotDelta
+]
+
+# Layout of each message type, including the header.  Positions are
+# sent as floats, which is plenty for a field of hundreds of units
+LAYOUTS: Dict[MessageType, struct.Struct] = {
+    MessageType.HANDSHAKE: struct.Struct('<BBH4sQ'),
+    MessageType.WELCOME: struct.Struct('<BBHQB'),
+    MessageType.SNAPSHOT: struct.Struct('<BBHI6fHH'),
+    MessageType.SCORE: struct.Struct('<BBHIHH'),
+}
+MESSAGE_CLASSES: Dict[MessageType, Type[Message]] = {
+    MessageType.HANDSHAKE: Handshake,
+    MessageType.INPUT: InputMessage,
+    MessageType.SNAPSHOT: Snapshot,
+    MessageType.SCORE: ScoreEvent,
+    MessageType.SNAPSHOT_DELTA: SnapshotDelta,
+    MessageType.WELCOME: Welcome,
+}
+MESSAGE_TYPES: Dict[Type[Message], MessageType] = {
+    message_class: message_type
+    for (message_type, message_class) in MESSAGE_CLASSES.items()
+}
+# Snapshot deltas have a header with the ticks and the changed fields,
+# followed by the values of those fields with their formats in the
+# snapshot (one per field after the tick)
+SNAPSHOT_FIELD_FORMATS = 'ffffffHH'
+DELTA_HEADER = struct.Struct('<BBHIIB')
+# Layouts of deltas by their changed fields, created when first used
+_delta_layouts: Dict[int, struct.Struct] = {}
+# Inputs have a header with the ticks and the number of inputs,
+# followed by the inputs
+INPUT_HEADER = struct.Struct('<BBHIIB')
+# Layouts of input messages by their number of inputs
+_input_layouts: Dict[int, struct.Struct] = {}
+
+
+def _input_layout(count: int) -> struct.Struct:
+    layout = _input_layouts.get(count)
+    if layout is None:
+        layout = struct.Struct(INPUT_HEADER.format + 'f'*count)
+        _input_layouts[count] = layout
+    return layout
+
+
+def _delta_layout(changed: int) -> struct.Struct:
+    layout = _delta_layouts.get(changed)
+    if layout is None:
+        layout = struct.Struct(DELTA_HEADER.format + ''.join(
+            field_format
+            for (i, field_format) in enumerate(SNAPSHOT_FIELD_FORMATS)
+            if changed & (1 << i)
+        ))
+        _delta_layouts[changed] = layout
+    return layout
+
+
+def snapshot_delta(base: Snapshot, snapshot: Snapshot) -> SnapshotDelta:
+    """Fields of the snapshot which differ from the base"""
+    changed = 0
+    values = []
+    for i in range(len(SNAPSHOT_FIELD_FORMATS)):
+        if snapshot[i + 1] != base[i + 1]:
+            changed |= 1 << i
+            values.append(snapshot[i + 1])
+    return SnapshotDelta(snapshot.tick, base.tick, changed, tuple(values))
+
+
+def apply_delta(base: Snapshot, delta: SnapshotDelta) -> Snapshot:
+    """Snapshot the delta was made from, given its base"""
+    fields: List = list(base)
+    fields[0] = delta.tick
+    values = iter(delta.values)
+    for i in range(len(SNAPSHOT_FIELD_FORMATS)):
+        if delta.changed & (1 << i):
+            fields[i + 1] = next(values)
+    return Snapshot._make(fields)
+
+
+def encode(message: Message, room_id: int = 0) -> bytes:
+    message_type = MESSAGE_TYPES[type(message)]
+    if message_type == MessageType.SNAPSHOT_DELTA:
+        return _delta_layout(message.changed).pack(
+            PROTOCOL_VERSION,
+            message_type,
+            room_id,
+            message.tick,
+            message.base_tick,
+            message.changed,
+            *message.values
+        )
+    if message_type == MessageType.INPUT:
+        return _input_layout(len(message.inputs)).pack(
+            PROTOCOL_VERSION,
+            message_type,
+            room_id,
+            message.tick,
+            message.sequence,
+            len(message.inputs),
+            *message.inputs
+        )
+    return LAYOUTS[message_type].pack(
+        PROTOCOL_VERSION,
+        message_type,
+        room_id,
+        *message
+    )
+
+
+def room_of(data: bytes) -> int:
+    """
+    Id of the room a datagram is addressed to, without decoding it.
+    @raises ProtocolError if the datagram has no valid header
+    """
+    if len(data) < HEADER.size:
+        raise ProtocolError("Datagram of {} bytes is too short".format(len(data)))
+    (version, _, room_id) = HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError("Unsupported protocol version {}".format(version))
+    return room_id
+
+
+def decode(data: bytes) -> Message:
+    """
+    Parses a received datagram (its room is given by `room_of`).
+    @returns Message of the class corresponding to its type
+    @raises ProtocolError if the datagram isn't a valid message
+    """
+    if len(data) < HEADER.size:
+        raise ProtocolError("Datagram of {} bytes is too short".format(len(data)))
+    (version, message_type, _) = HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError("Unsupported protocol version {}".format(version))
+    if message_type == MessageType.SNAPSHOT_DELTA:
+        return _decode_delta(data)
+    if message_type == MessageType.INPUT:
+        return _decode_input(data)
+    layout = LAYOUTS.get(message_type)
+    if layout is None:
+        raise ProtocolError("Unknown message type {}".format(message_type))
+    if len(data) != layout.size:
+        raise ProtocolError("{} message of {} bytes, expected {}".format(
+            MessageType(message_type).name,
+            len(data),
+            layout.size
+        ))
+    message = MESSAGE_CLASSES[message_type]._make(layout.unpack(data)[3:])
+    if message_type == MessageType.HANDSHAKE and message.magic != HANDSHAKE_MAGIC:
+        raise ProtocolError("Wrong handshake magic {!r}".format(message.magic))
+    return message
+
+
+def _decode_delta(data: bytes) -> SnapshotDelta:
+    if len(data) < DELTA_HEADER.size:
+        raise ProtocolError("Snapshot delta of {} bytes is too short".format(
+            len(data)
+        ))
+    changed = data[DELTA_HEADER.size - 1]
+    if changed >> len(SNAPSHOT_FIELD_FORMATS):
+        raise ProtocolError("Unknown snapshot fields {:#x}".format(changed))
+    layout = _delta_layout(changed)
+    if len(data) != layout.size:
+        raise ProtocolError("Snapshot delta of {} bytes, expected {}".format(
+            len(data),
+            layout.size
+        ))
+    fields = layout.unpack(data)
+    return SnapshotDelta(fields[3], fields[4], changed, fields[6:])
+
+
+def _decode_input(data: bytes) -> InputMessage:
+    if len(data) < INPUT_HEADER.size:
+        raise ProtocolError("Input of {} bytes is too short".format(len(data)))
+    count = data[INPUT_HEADER.size - 1]
+    if count == 0:
+        raise ProtocolError("Input message without inputs")
+    layout = _input_layout(count)
+    if len(data) != layout.size:
+        raise ProtocolError("Input of {} bytes, expected {}".format(
+            len(data),
+            layout.size
+        ))
+    fields = layout.unpack(data)
+    return InputMessage(fields[3], fields[4], fields[6:])
+
+
+class InputSender:
+    """
+    Client side of the input stream: numbers the inputs and puts the
+    last `redundancy` of them into every message.
+    """
+    # Sequence number of the last input, -1 before the first one
+    sequence: int
+    recent: Deque[float]
+
+    def __init__(
+        self,
+        redundancy: int = library.constants.INPUT_REDUNDANCY
+    ):
+        self.sequence = -1
+        self.recent = deque(maxlen=redundancy)
+
+    def message(self, ack_tick: int, y: float) -> InputMessage:
+        """@returns Message with the new input and the ones before it"""
+        self.sequence += 1
+        self.recent.append(y)
+        return InputMessage(ack_tick, self.sequence, tuple(self.recent))
+
+
+class SnapshotReceiver:
+    """
+    Client side of snapshot deltas: keeps the last received snapshots,
+    so that deltas against any of them can be applied, and the tick to
+    acknowledge.
+    """
+    # Received snapshots, indexed by tick modulo their number
+    snapshots: List[Snapshot]
+    # Tick of the newest snapshot received
+    latest_tick: int
+
+    def __init__(
+        self,
+        history_size: int = library.constants.SNAPSHOT_HISTORY_SIZE
+    ):
+        self.snapshots = [None]*history_size
+        self.latest_tick = None
+
+    def receive(self, message: Union[Snapshot, SnapshotDelta]) -> Snapshot:
+        """
+        @returns The received snapshot, None if it is older than the
+        latest one or its base isn't known anymore
+        """
+        if self.latest_tick is not None and message.tick <= self.latest_tick:
+            return None
+        if isinstance(message, SnapshotDelta):
+            base = self.snapshots[message.base_tick % len(self.snapshots)]
+            if base is None or base.tick != message.base_tick:
+                return None
+            snapshot = apply_delta(base, message)
+        else:
+            snapshot = message
+        self.snapshots[snapshot.tick % len(self.snapshots)] = snapshot
+        self.latest_tick = snapshot.tick
+        return snapshot
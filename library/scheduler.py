@@ -0,0 +1,159 @@
+from math import sqrt
+import time
+
+import library.constants
+
+
+class JitterStats:
+    """
+    How precisely the scheduler wakes up.  Lateness is measured against
+    each tick's deadline, intervals between consecutive wake-ups (their
+    deviation from the period is the jitter seen by the network).
+    """
+    ticks: int
+    # Sum and maximum of (wake-up time - deadline)
+    lateness_total_ns: int
+    lateness_max_ns: int
+    # Running mean and sum of squared deviations of intervals (Welford)
+    interval_mean_ns: float
+    interval_m2: float
+    interval_min_ns: int
+    interval_max_ns: int
+    # Deadlines given up because the loop fell too far behind
+    skipped_ticks: int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.ticks = 0
+        self.lateness_total_ns = 0
+        self.lateness_max_ns = 0
+        self.interval_mean_ns = 0.0
+        self.interval_m2 = 0.0
+        self.interval_min_ns = None
+        self.interval_max_ns = None
+        self.skipped_ticks = 0
+
+    def add(self, lateness_ns: int, interval_ns: int) -> None:
+        self.ticks += 1
+        self.lateness_total_ns += lateness_ns
+        if lateness_ns > self.lateness_max_ns:
+            self.lateness_max_ns = lateness_ns
+        if interval_ns is None:
+            return
+        intervals = self.ticks - 1
+        delta = interval_ns - self.interval_mean_ns
+        self.interval_mean_ns += delta / intervals
+        self.interval_m2 += delta * (interval_ns - self.interval_mean_ns)
+        if self.interval_min_ns is None or interval_ns < self.interval_min_ns:
+            self.interval_min_ns = interval_ns
+        if self.interval_max_ns is None or interval_ns > self.interval_max_ns:
+            self.interval_max_ns = interval_ns
+
+    def interval_stddev_ns(self) -> float:
+        if self.ticks < 3:
+            return 0.0
+        return sqrt(self.interval_m2 / (self.ticks - 2))
+
+    def report(self) -> str:
+        if self.ticks == 0:
+            return "No ticks scheduled"
+        return (
+            "{} ticks, lateness mean {:.1f} us max {:.1f} us, interval "
+            "{:.1f} us +- {:.1f} us (min {:.1f}, max {:.1f}), {} skipped"
+        ).format(
+            self.ticks,
+            self.lateness_total_ns / self.ticks * 1e-3,
+            self.lateness_max_ns * 1e-3,
+            self.interval_mean_ns * 1e-3,
+            self.interval_stddev_ns() * 1e-3,
+            (self.interval_min_ns or 0) * 1e-3,
+            (self.interval_max_ns or 0) * 1e-3,
+            self.skipped_ticks
+        )
+
+
+class TickScheduler:
+    """
+    Wakes a loop up at a fixed rate.  Deadlines are absolute (start time
+    plus a whole number of periods), so delays don't accumulate into
+    drift.  Waiting sleeps until `spin_window_ns` before the deadline,
+    which the OS may overshoot, and spins for the rest.
+    """
+    period_ns: int
+    spin_window_ns: int
+    # When behind by more than this many periods, the missed deadlines
+    # are skipped instead of being run back to back
+    max_lag_ticks: int
+    start_ns: int
+    # Index of the next deadline
+    tick_index: int
+    last_wake_ns: int
+    # Time between the previous 2 wake-ups
+    frame_ms: float
+    stats: JitterStats
+
+    def __init__(
+        self,
+        rate_hz: float = library.constants.TICK_RATE_LIMIT,
+        spin_window_ms: float = library.constants.SCHEDULER_SPIN_WINDOW_MS,
+        max_lag_ticks: int = library.constants.SCHEDULER_MAX_LAG_TICKS
+    ):
+        self.period_ns = round(1e9 / rate_hz)
+        self.spin_window_ns = round(spin_window_ms * 1e6)
+        self.max_lag_ticks = max_lag_ticks
+        self.stats = JitterStats()
+        self.start()
+
+    def start(self) -> None:
+        """Starts counting deadlines from now"""
+        self.start_ns = time.perf_counter_ns()
+        self.tick_index = 1
+        self.last_wake_ns = None
+        self.frame_ms = 0.0
+
+    def deadline_ns(self) -> int:
+        return self.start_ns + self.tick_index*self.period_ns
+
+    def sleep_ns(self) -> int:
+        """
+        Time which can be slept before spinning for the next deadline,
+        for loops which sleep in their own way (e.g. event loops) and
+        call `wait` afterwards to spin for the rest.
+        """
+        return max(
+            0,
+            self.deadline_ns() - time.perf_counter_ns() - self.spin_window_ns
+        )
+
+    def wait(self) -> float:
+        """
+        Waits for the next deadline.
+        @returns Milliseconds since the previous wake-up
+        """
+        deadline = self.deadline_ns()
+        now = time.perf_counter_ns()
+        if now - deadline > self.max_lag_ticks*self.period_ns:
+            # Give up on the missed deadlines
+            missed = (now - deadline) // self.period_ns
+            self.tick_index += missed
+            self.stats.skipped_ticks += missed
+            deadline = self.deadline_ns()
+        sleep_ns = deadline - now - self.spin_window_ns
+        if sleep_ns > 0:
+            time.sleep(sleep_ns * 1e-9)
+        now = time.perf_counter_ns()
+        while now < deadline:
+            now = time.perf_counter_ns()
+        self.tick_index += 1
+
+        if self.last_wake_ns is None:
+            interval = None
+            self.frame_ms = 0.0
+        else:
+            interval = now - self.last_wake_ns
+            self.frame_ms = interval * 1e-6
+        self.stats.add(now - deadline, interval)
+        self.last_wake_ns = now
+        return self.frame_ms
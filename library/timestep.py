@@ -0,0 +1,64 @@
+import library.constants
+
+
+class FixedTimestep:
+    """
+    Splits real frame time into simulation steps of fixed length, so
+    the physics doesn't depend on frame rate jitter and gives the same
+    results for the same inputs.  Time is accumulated in integer
+    nanoseconds to keep it exact.
+    """
+    step_ns: int
+    # Upper limit of steps simulated per frame.  Time above it is dropped
+    # (the simulation slows down) instead of being caught up with
+    max_steps: int
+    # Real time not simulated yet, always less than a step after
+    # `advance`
+    accumulator_ns: int
+    # Statistics
+    total_steps: int
+    dropped_ns: int
+
+    def __init__(
+        self,
+        step_ms: float = library.constants.PHYSICS_STEP_MS,
+        max_steps: int = library.constants.PHYSICS_MAX_STEPS_PER_FRAME
+    ):
+        self.step_ns = round(step_ms * 1e6)
+        if self.step_ns <= 0:
+            raise ValueError("Step must be positive, got {}".format(step_ms))
+        self.max_steps = max_steps
+        self.accumulator_ns = 0
+        self.total_steps = 0
+        self.dropped_ns = 0
+
+    @property
+    def step_ms(self) -> float:
+        """Length of the step in the units `tick_state` expects"""
+        return self.step_ns / 1e6
+
+    @property
+    def alpha(self) -> float:
+        """
+        Fraction of a step accumulated but not simulated yet, in [0, 1).
+        Renderers can interpolate between the last 2 states with it.
+        """
+        return self.accumulator_ns / self.step_ns
+
+    def advance(self, frame_ms: float) -> int:
+        """
+        Accumulates time of the frame.
+        @returns Number of fixed steps to simulate now
+        """
+        self.accumulator_ns += round(frame_ms * 1e6)
+        steps = self.accumulator_ns // self.step_ns
+        if steps > self.max_steps:
+            # Don't let a slow frame turn into a huge catch-up
+            self.dropped_ns += (steps - self.max_steps) * self.step_ns
+            steps = self.max_steps
+        self.accumulator_ns -= (self.accumulator_ns // self.step_ns) * self.step_ns
+        self.total_steps += steps
+        return steps
+
+    def reset(self) -> None:
+        self.accumulator_ns = 0
@@ -1,4 +1,4 @@
-from math import sqrt
+from math import sqrt, sin, cos
 from typing import Tuple
 import numpy as np
 
@@ -45,21 +45,33 @@ def point_in_box(
     box_corner_1: Tuple[float, float],
     box_corner_2: Tuple[float, float]
 ) -> bool:
+    return in_box(
+        point[0], point[1],
+        box_corner_1[0], box_corner_1[1],
+        box_corner_2[0], box_corner_2[1]
+    )
+
+
+def in_box(
+    x: float,
+    y: float,
+    corner_1_x: float,
+    corner_1_y: float,
+    corner_2_x: float,
+    corner_2_y: float
+) -> bool:
+    """
+    Same as `point_in_box`, but takes plain coordinates, so nothing has
+    to be allocated to call it
+    """
     # As was found in debugging, sometimes computing error cause
     # the algorithm believe that the collision point is located outside
     # the segments (usually at scale of 1e-15).  It seems to happen only
     # on horizontal lines.  Thus, let's add some margin of error.
-    min_corner = (
-        min(box_corner_1[0], box_corner_2[0]) - library.constants.ERROR_MARGIN,
-        min(box_corner_1[1], box_corner_2[1])
-    )
-    max_corner = (
-        max(box_corner_1[0], box_corner_2[0]) + library.constants.ERROR_MARGIN,
-        max(box_corner_1[1], box_corner_2[1])
-    )
-
-    return (min_corner[0] <= point[0] <= max_corner[0]
-            and min_corner[1] <= point[1] <= max_corner[1])
+    return (min(corner_1_x, corner_2_x) - library.constants.ERROR_MARGIN
+            <= x
+            <= max(corner_1_x, corner_2_x) + library.constants.ERROR_MARGIN
+            and min(corner_1_y, corner_2_y) <= y <= max(corner_1_y, corner_2_y))
 
 
 def rotation_matrix_2d(
@@ -69,8 +81,8 @@ def rotation_matrix_2d(
     Calculates 2D rotational matrix for given angle alpha (counter
     clockwise for xy-plane with inverted y, like in our case)
     """
-    cosine = np.math.cos(alpha)
-    sine = np.math.sin(alpha)
+    cosine = cos(alpha)
+    sine = sin(alpha)
     return np.array([
         [cosine, -sine],
         [sine, cosine]
@@ -81,14 +93,15 @@ def mirror_vector_2d(
     input_vector: Tuple[float, float],
     mirror_normal: Tuple[float, float]
 ) -> Tuple[float, float]:
-    vec: np.ndarray = np.array(input_vector)
-    normal: np.ndarray = np.array(mirror_normal)
+    (x, y) = input_vector
     # Normalize the normal (lol)
-    normal /= np.linalg.norm(normal)
+    magnitude = sqrt(mirror_normal[0]**2 + mirror_normal[1]**2)
+    normal_x = mirror_normal[0] / magnitude
+    normal_y = mirror_normal[1] / magnitude
     # Substract 2 projections of movement onto normal to get the
     # reflected vector
-    vec -= 2*(normal.dot(vec))*normal
-    return (vec[0], vec[1])
+    projection = 2*(normal_x*x + normal_y*y)
+    return (x - projection*normal_x, y - projection*normal_y)
 
 
 def change_origin(
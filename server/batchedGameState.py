@@ -0,0 +1,374 @@
+from typing import Tuple
+import numpy as np
+
+import library.collisions
+import library.constants
+import library.customObjects
+import server.gameState
+
+
+class BatchedGameState:
+    """
+    K independent matches stored as a struct of arrays and simulated all
+    at once with vectorized collision math.  Follows the same rules as
+    `server.gameState.GameState` (ball bouncing off the field sides and
+    both paddles, paddles stopping right before the ball, goals
+    resetting the match), so its outcomes match the scalar state up to
+    rounding.  Meant for training and balance sweeps, where many
+    matches are played with the same field.
+    """
+    # Entity ids, the same as in the scalar game state
+    SIDE_LEFT = server.gameState.GameState.SIDE_LEFT
+    SIDE_RIGHT = server.gameState.GameState.SIDE_RIGHT
+    PLAYER, ENEMY = range(4, 6)
+
+    matches: int
+    field_size: Tuple[float, float]
+    ball_starting_pos: Tuple[float, float]
+    ball_radius: float
+    paddle_size: Tuple[float, float]
+    # (K, 2) position and velocity of the ball of each match
+    ball_pos: np.ndarray
+    ball_vel: np.ndarray
+    # (K, 2, 2) upper left corners of the paddles, player first
+    paddle_pos: np.ndarray
+    # (K, 2, 2) moves requested for the next tick, player first
+    desired_move: np.ndarray
+    # (K, 2) scores of the player and the enemy
+    scores: np.ndarray
+    # (K,) id of the entity whose collision was just resolved (see the
+    # scalar game state), `NO_ENTITY` if there is none
+    resolved_collision_id: np.ndarray
+    # Field sides in the order LEFT, UP, RIGHT, DOWN, as (4, 2) arrays
+    side_starts: np.ndarray
+    side_ends: np.ndarray
+
+    def __init__(
+        self,
+        matches: int,
+        field_size: Tuple[float, float] = library.constants.GAME_FIELD_SIZE
+    ) -> None:
+        self.matches = matches
+        self.field_size = field_size
+        self.ball_starting_pos = (
+            library.constants.BALL_STARTING_POS[0]
+            * field_size[0] / library.constants.GAME_FIELD_SIZE[0],
+            library.constants.BALL_STARTING_POS[1]
+            * field_size[1] / library.constants.GAME_FIELD_SIZE[1]
+        )
+        self.ball_radius = float(library.constants.BALL_RADIUS)
+        self.paddle_size = (
+            float(library.constants.PLAYER_SIZE[0]),
+            float(library.constants.PLAYER_SIZE[1])
+        )
+        self.ball_pos = np.empty((matches, 2))
+        self.ball_vel = np.empty((matches, 2))
+        self.paddle_pos = np.empty((matches, 2, 2))
+        self.desired_move = np.empty((matches, 2, 2))
+        self.scores = np.zeros((matches, 2), dtype=np.int64)
+        self.resolved_collision_id = np.empty(matches, dtype=np.int64)
+        sides = np.array(
+            server.gameState.GameState.generate_sides(
+                self.ball_radius,
+                field_size
+            ),
+            dtype=float
+        )
+        self.side_starts = sides[:, 0]
+        self.side_ends = sides[:, 1]
+        self.reset_entities(np.ones(matches, dtype=bool))
+
+    def tick_state(self, t: float) -> None:
+        """Advances every match by `t` ms"""
+        for paddle in (0, 1):
+            self.players_physics(paddle)
+        self.ball_physics(t)
+
+    def reset_entities(self, mask: np.ndarray) -> None:
+        """Puts the ball and the paddles of the masked matches back"""
+        self.ball_pos[mask] = self.ball_starting_pos
+        self.ball_vel[mask] = library.constants.BALL_STARTING_SPEED
+        self.paddle_pos[mask, 0] = (0.0, 0.0)
+        self.paddle_pos[mask, 1] = (
+            self.field_size[0] - self.paddle_size[0],
+            0.0
+        )
+        self.desired_move[mask] = 0.0
+        self.resolved_collision_id[mask] = library.customObjects.NO_ENTITY
+
+    def import_match(
+        self,
+        index: int,
+        game_state: server.gameState.GameState
+    ) -> None:
+        """Copies the state of a scalar match into the given slot"""
+        ball = game_state.ball
+        self.ball_pos[index] = (ball.x_pos, ball.y_pos)
+        self.ball_vel[index] = (ball.x_vel, ball.y_vel)
+        for (paddle, brick) in enumerate(
+            (game_state.player_brick, game_state.enemy_brick)
+        ):
+            self.paddle_pos[index, paddle] = (brick.x_pos, brick.y_pos)
+            self.desired_move[index, paddle] = brick.desired_move
+        self.scores[index] = (game_state.player_score, game_state.enemy_score)
+        self.resolved_collision_id[index] = game_state.resolved_collision_id
+
+    def export_match(
+        self,
+        index: int,
+        game_state: server.gameState.GameState
+    ) -> None:
+        """Copies the state of the given slot into a scalar match"""
+        ball = game_state.ball
+        (ball.x_pos, ball.y_pos) = self.ball_pos[index].tolist()
+        (ball.x_vel, ball.y_vel) = self.ball_vel[index].tolist()
+        for (paddle, (brick, brick_id)) in enumerate((
+            (game_state.player_brick, game_state.player_id),
+            (game_state.enemy_brick, game_state.enemy_id)
+        )):
+            brick.moveTo(*self.paddle_pos[index, paddle].tolist())
+            brick.set_desired_move(*self.desired_move[index, paddle].tolist())
+            game_state.update_brick(brick_id)
+        (
+            game_state.player_score,
+            game_state.enemy_score
+        ) = self.scores[index].tolist()
+        game_state.resolved_collision_id = int(
+            self.resolved_collision_id[index]
+        )
+
+    def collide_paddles(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        paddle_pos: np.ndarray
+    ) -> library.collisions.BatchCollisions:
+        """
+        Vectorized `collision_ball_brick` of N movements of the ball
+        (arrays of shape (N, 2)), each against its own paddle (upper left
+        corners of shape (N, 2)).
+        @returns Collisions of shape (N, 1)
+        """
+        r = self.ball_radius
+        (w, h) = self.paddle_size
+        # Only movements overlapping the bounding box of the stadium can
+        # hit it (see `_misses_stadium_box`), the rest is skipped
+        margin = library.constants.ERROR_MARGIN
+        move_min = np.minimum(starts, ends)
+        move_max = np.maximum(starts, ends)
+        near = np.nonzero(
+            np.all(move_max >= paddle_pos - (r + margin), axis=-1)
+            & np.all(
+                move_min <= paddle_pos + (w + r + margin, h + r + margin),
+                axis=-1
+            )
+        )[0]
+        collisions = _no_collisions(len(starts), 1)
+        if len(near) == 0:
+            return collisions
+        starts = starts[near]
+        ends = ends[near]
+        paddle_pos = paddle_pos[near]
+        (x, y) = (paddle_pos[:, 0], paddle_pos[:, 1])
+        # Stadium of every paddle, sides in the order LEFT, RIGHT, TOP,
+        # BOTTOM and corners in the order LEFT TOP, RIGHT TOP, LEFT
+        # BOTTOM, RIGHT BOTTOM (see `get_stadium_geometry`)
+        side_starts = np.stack((
+            np.stack((x - r, y), axis=-1),
+            np.stack((x + w + r, y), axis=-1),
+            np.stack((x, y - r), axis=-1),
+            np.stack((x, y + h + r), axis=-1)
+        ), axis=1)
+        side_ends = np.stack((
+            np.stack((x - r, y + h), axis=-1),
+            np.stack((x + w + r, y + h), axis=-1),
+            np.stack((x + w, y - r), axis=-1),
+            np.stack((x + w, y + h + r), axis=-1)
+        ), axis=1)
+        corner_origs = np.stack((
+            paddle_pos,
+            np.stack((x + w, y), axis=-1),
+            np.stack((x, y + h), axis=-1),
+            np.stack((x + w, y + h), axis=-1)
+        ), axis=1)
+        # Boxes are spanned from each corner away from the paddle
+        corner_boxes = np.stack(
+            (corner_origs, corner_origs + np.array([
+                [-r, -r],
+                [r, -r],
+                [-r, r],
+                [r, r]
+            ])),
+            axis=2
+        )
+        sides = library.collisions.batch_collision_vector_segment(
+            starts, ends, side_starts, side_ends
+        )
+        corners = library.collisions.batch_collision_vector_circle(
+            starts, ends, corner_origs, np.full(4, r), corner_boxes
+        )
+        earliest = library.collisions.batch_earliest(
+            library.collisions.BatchCollisions(*(
+                np.concatenate(fields, axis=1)
+                for fields in zip(sides, corners)
+            )),
+            8
+        )
+        for (field, near_field) in zip(collisions, earliest):
+            field[near] = near_field
+        return collisions
+
+    def collide_sides(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray
+    ) -> library.collisions.BatchCollisions:
+        """
+        Collisions of N movements of the ball (arrays of shape (N, 2))
+        with the field sides.  Movements staying clear of the sides are
+        not checked.
+        @returns Collisions of shape (N, 4)
+        """
+        margin = library.constants.ERROR_MARGIN
+        near = np.nonzero(
+            np.any(np.minimum(starts, ends) <= self.side_starts[0] + margin,
+                   axis=-1)
+            | np.any(np.maximum(starts, ends) >= self.side_ends[2] - margin,
+                     axis=-1)
+        )[0]
+        collisions = _no_collisions(len(starts), 4)
+        if len(near) == 0:
+            return collisions
+        near_collisions = library.collisions.batch_collision_vector_segment(
+            starts[near], ends[near], self.side_starts, self.side_ends
+        )
+        for (field, near_field) in zip(collisions, near_collisions):
+            field[near] = near_field
+        return collisions
+
+    def players_physics(self, paddle: int) -> None:
+        """
+        Moves the paddle (0 for the player, 1 for the enemy) of every
+        match by its desired move, stopping right before the ball, like
+        `GameState.players_physics` does.
+        """
+        move = self.desired_move[:, paddle]
+        # The paddle is the point of reference, so the ball moves
+        # in the opposite direction
+        collisions = self.collide_paddles(
+            self.ball_pos,
+            self.ball_pos - move,
+            self.paddle_pos[:, paddle]
+        )
+        hit = collisions.hit[:, 0]
+        free = ~hit
+        self.paddle_pos[free, paddle] += move[free]
+        # Only the part of the move before the impact, minus a little gap
+        y_move = collisions.time[hit, 0] * move[hit, 1]
+        y_move -= np.copysign(library.constants.ERROR_MARGIN, y_move)
+        self.paddle_pos[hit, paddle, 1] += y_move
+        move[:] = 0.0
+
+    def ball_physics(self, t: float) -> None:
+        """
+        Moves the balls, bouncing them off the sides and paddles, and
+        counts goals.  Every round resolves the first impact of each
+        match still moving, so the number of rounds is the highest
+        number of bounces in a tick rather than the number of matches.
+        """
+        # Indices of the matches whose ball still moves in this tick
+        active = np.arange(self.matches)
+        starts = self.ball_pos.copy()
+        moves = self.ball_vel * (t*1e-1)
+        for _ in range(library.constants.BATCHED_MAX_BOUNCES):
+            if len(active) == 0:
+                return
+            start = starts[active]
+            move = moves[active]
+            end = start + move
+            sides = self.collide_sides(start, end)
+            player = self.collide_paddles(
+                start, end, self.paddle_pos[active, 0]
+            )
+            enemy = self.collide_paddles(
+                start, end, self.paddle_pos[active, 1]
+            )
+            # Columns are indexed by entity ids
+            (_, time, position, normal) = (
+                np.concatenate(fields, axis=1)
+                for fields in zip(sides, player, enemy)
+            )
+            # Resolution of the collision skips only one iteration
+            rows = np.arange(len(active))
+            skipped = self.resolved_collision_id[active]
+            skipping = skipped != library.customObjects.NO_ENTITY
+            time[rows[skipping], skipped[skipping]] = np.inf
+            self.resolved_collision_id[active] = (
+                library.customObjects.NO_ENTITY
+            )
+            # Ties go to the lowest id, like in the scalar version
+            first = np.argmin(time, axis=1)
+            first_time = time[rows, first]
+
+            hit = np.isfinite(first_time)
+            goal = hit & (
+                (first == self.SIDE_LEFT) | (first == self.SIDE_RIGHT)
+            )
+            bounce = hit & ~goal
+            # No more collisions for these
+            self.ball_pos[active[~hit]] = end[~hit]
+
+            if np.any(goal):
+                scored = active[goal]
+                # Touching the left side is a goal of the enemy and
+                # vice versa
+                np.add.at(
+                    self.scores,
+                    (scored, (first[goal] == self.SIDE_LEFT).astype(int)),
+                    1
+                )
+                self.reset_entities(scored)
+
+            # Resolve the first impact of the rest
+            rows = rows[bounce]
+            bounced = active[bounce]
+            remaining = 1.0 - first_time[bounce]
+            impact_normal = normal[rows, first[bounce]]
+            impact_normal /= np.linalg.norm(
+                impact_normal, axis=-1, keepdims=True
+            )
+            new_start = position[rows, first[bounce]]
+            new_move = _mirror(move[bounce] * remaining[:, None], impact_normal)
+            self.ball_vel[bounced] = _mirror(
+                self.ball_vel[bounced],
+                impact_normal
+            )
+            self.resolved_collision_id[bounced] = first[bounce]
+            new_end = new_start + new_move
+            # Nowhere to move anymore
+            stopped = np.all(new_end == new_start, axis=-1)
+            self.ball_pos[bounced[stopped]] = new_end[stopped]
+            starts[bounced] = new_start
+            moves[bounced] = new_move
+            active = bounced[~stopped]
+        # Too many bounces, leave the rest of the move unchecked
+        self.ball_pos[active] = starts[active] + moves[active]
+
+
+def _mirror(vectors: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    """
+    Vectorized `mirror_vector_2d` for (N, 2) arrays of vectors and unit
+    normals
+    """
+    projection = 2*np.sum(vectors*normals, axis=-1, keepdims=True)
+    return vectors - projection*normals
+
+
+def _no_collisions(n: int, m: int) -> library.collisions.BatchCollisions:
+    """Empty collisions of shape (N, M) to be filled in"""
+    return library.collisions.BatchCollisions(
+        np.zeros((n, m), dtype=bool),
+        np.full((n, m), np.inf),
+        np.zeros((n, m, 2)),
+        np.zeros((n, m, 2))
+    )
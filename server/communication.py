@@ -1,92 +1,333 @@
 from typing import Dict, List, Tuple
-import socket
-import json
+import asyncio
+import time
 
-from library.constants import WELCOME_MESSAGE
 from server.serverSettings import BIND_IP, BIND_PORT
+import library.constants
+import library.protocol
+import server.jitterBuffer
+import server.metrics
+import server.transport
+
+
+class SnapshotHistory:
+    """
+    Snapshots sent to one client, so that the next ones can be sent as
+    deltas against the latest one it acknowledged.  When it hasn't
+    acknowledged any snapshot still kept (at the start and after losing
+    more packets than the history holds), a full snapshot is sent.
+    """
+    # Sent snapshots, indexed by tick modulo their number
+    snapshots: List[library.protocol.Snapshot]
+    # Newest tick acknowledged by the client, None if there is none
+    acked_tick: int
+    # Snapshots sent, of them full ones, and their bytes
+    sent: int
+    full_sent: int
+    bytes_sent: int
+
+    def __init__(
+        self,
+        size: int = library.constants.SNAPSHOT_HISTORY_SIZE
+    ):
+        self.snapshots = [None]*size
+        self.acked_tick = None
+        self.sent = 0
+        self.full_sent = 0
+        self.bytes_sent = 0
+
+    def ack(self, tick: int) -> None:
+        if self.acked_tick is None or tick > self.acked_tick:
+            self.acked_tick = tick
+
+    def encode(
+        self,
+        snapshot: library.protocol.Snapshot,
+        room_id: int = 0,
+        encoded: Dict[int, bytes] = None
+    ) -> bytes:
+        """
+        Encodes the snapshot as a delta against the acknowledged one if
+        it's still kept, as a full snapshot otherwise.  Encodings of the
+        same snapshot for other clients can be shared through `encoded`
+        (by the tick of the base, None for the full snapshot).
+        """
+        base = None
+        if self.acked_tick is not None:
+            base = self.snapshots[self.acked_tick % len(self.snapshots)]
+            if base is not None and base.tick != self.acked_tick:
+                # Overwritten by a newer snapshot
+                base = None
+        base_tick = None if base is None else base.tick
+        message = None if encoded is None else encoded.get(base_tick)
+        if message is None:
+            if base is None:
+                message = library.protocol.encode(snapshot, room_id)
+            else:
+                message = library.protocol.encode(
+                    library.protocol.snapshot_delta(base, snapshot),
+                    room_id
+                )
+            if encoded is not None:
+                encoded[base_tick] = message
+        if base is None:
+            self.full_sent += 1
+        self.snapshots[snapshot.tick % len(self.snapshots)] = snapshot
+        self.sent += 1
+        self.bytes_sent += len(message)
+        return message
+
+    def bytes_per_tick(self) -> float:
+        if self.sent == 0:
+            return 0.0
+        return self.bytes_sent / self.sent
+
 
 class Communication:
     """
-    Keeps up-to-date buffered information recieved from clients (with 
-    `startUpdating`) and gives simpler interface for addressing them
-    (indexes instead of addresses).
+    Keeps up-to-date buffered information recieved from clients of one
+    room and gives simpler interface for addressing them (indexes
+    instead of addresses).  Datagrams are handled by an asyncio
+    transport as they arrive, on the event loop which also runs the
+    server's ticks, the blocking methods only run that loop until what
+    they wait for.
+
+    Without an endpoint given, it opens its own and waits for the
+    players right away.  A server hosting many rooms shares one endpoint
+    and routes datagrams to `datagram_received` of each room instead.
     """
-    player_addrs: Tuple[Tuple[str, int]]
-    player_data: List[Dict]
+    player_addrs: List[Tuple[str, int]]
+    # Index of each player by its address
+    player_indexes: Dict[Tuple[str, int], int]
+    # Latest input message of each player, None until the first one
+    # arrives
+    player_data: List[library.protocol.InputMessage]
+    # Inputs of each player, to be consumed one per tick
+    jitter_buffers: List[server.jitterBuffer.JitterBuffer]
+    # Snapshots sent to each player
+    snapshot_histories: List[SnapshotHistory]
     players_num: int
-    connection_socket: socket.socket
+    # Room whose id is put in the sent messages
+    room_id: int
+    loop: asyncio.AbstractEventLoop
+    endpoint: server.transport.DatagramServer
+    # Whether the endpoint was opened by this object (and is closed by it)
+    owns_endpoint: bool
+    # Resolved when all players are connected
+    players_connected: asyncio.Future
+    # Resolved with the next message from a player and its index, for
+    # `recv_from_any`
+    next_message: asyncio.Future
+    # Latency of sending and handling of recieved messages
+    metrics: server.metrics.Metrics
     
 
-    def __init__(self, players_num):
+    def __init__(
+        self,
+        players_num,
+        metrics: server.metrics.Metrics = None,
+        loop: asyncio.AbstractEventLoop = None,
+        endpoint: server.transport.DatagramServer = None,
+        room_id: int = 0
+    ):
         """
         Wait for required number of clients and creates necessary
         entries for them.
         """
-        self.player_addrs = ()
+        self.metrics = metrics if metrics is not None else server.metrics.Metrics()
+        self.player_addrs = []
+        self.player_indexes = {}
         self.player_data = []
+        self.jitter_buffers = []
+        self.snapshot_histories = []
         self.players_num = players_num
-        self.connection_socket = socket.socket(
-            socket.AF_INET,
-            socket.SOCK_DGRAM
-        )
-        self.connection_socket.bind(
-            (BIND_IP, BIND_PORT)
+        self.room_id = room_id
+        self.loop = loop if loop is not None else asyncio.new_event_loop()
+        self.players_connected = self.loop.create_future()
+        self.next_message = None
+        self.owns_endpoint = endpoint is None
+        if endpoint is not None:
+            self.endpoint = endpoint
+            return
+        self.endpoint = self.loop.run_until_complete(
+            server.transport.open_server(
+                self.datagram_received,
+                (BIND_IP, BIND_PORT)
+            )
         )
         self.connect_clients()
     
 
     def connect_clients(self):
-        players = []
-        for i in range(self.players_num):
-            msg = ''
-            while msg != WELCOME_MESSAGE:
-                msg, addr = self.connection_socket.recvfrom(1024)
-            # msg == WELCOME_MESSAGE
-            players.append(addr)
-            self.player_data.append({})
+        """Runs the event loop until all players are connected"""
+        if self.players_num == 0:
+            return
+        self.loop.run_until_complete(self.players_connected)
+
+
+    def datagram_received(self, msg: bytes, addr: Tuple[str, int]) -> None:
+        """Handles each datagram recieved by the transport"""
+        start = time.perf_counter_ns()
+        index = self.player_indexes.get(addr)
+        if index is None:
+            self.add_player(msg, addr)
+            return
+        self.metrics.record('recv', time.perf_counter_ns() - start)
+        self.player_message(index, msg)
+
+
+    def player_message(self, index: int, msg: bytes) -> None:
+        """Handles a message from the player of the index"""
+        start = time.perf_counter_ns()
+        self.save_player_data(index, msg)
+        self.metrics.record('save_player_data', time.perf_counter_ns() - start)
+        if self.next_message is not None and not self.next_message.done():
+            self.next_message.set_result((msg, index))
+
+
+    def add_player(self, msg: bytes, addr: Tuple[str, int]) -> int:
+        """
+        Connects the sender of a handshake while there are free slots
+        @returns Index of the new player, None if it wasn't added
+        """
+        if self.is_full():
+            print("Recieved message from unexpected address '{}'!".format(addr))
+            return None
+        try:
+            message = library.protocol.decode(msg)
+        except library.protocol.ProtocolError:
+            return None
+        if not isinstance(message, library.protocol.Handshake):
+            return None
+        index = len(self.player_addrs)
+        self.player_addrs.append(addr)
+        self.player_indexes[addr] = index
+        self.player_data.append(None)
+        self.jitter_buffers.append(server.jitterBuffer.JitterBuffer())
+        self.snapshot_histories.append(SnapshotHistory())
+        if self.is_full():
+            self.players_connected.set_result(None)
+        return index
+
+
+    def rebind_player(self, index: int, addr: Tuple[str, int]) -> None:
+        """Moves the player to a new address (after a reconnect)"""
+        del self.player_indexes[self.player_addrs[index]]
+        self.player_addrs[index] = addr
+        self.player_indexes[addr] = index
+
+
+    def is_full(self) -> bool:
+        return len(self.player_addrs) >= self.players_num
     
 
     def sendToPlayer(self, msg, player_index) -> int:
         """
-        Calls `sendto` with corresponding player's address.  Passes the
-        value recieved (view `sendto` docs for details).
+        Sends the message to the corresponding player's address.
+        @returns Number of bytes sent
         """
-        return self.connection_socket.sendto(
+        start = time.perf_counter_ns()
+        sent = self.endpoint.sendto(
             msg,
             self.player_addrs[player_index]
         )
+        self.metrics.record('send', time.perf_counter_ns() - start)
+        return sent
+
+    def send_snapshot(
+        self,
+        snapshot: library.protocol.Snapshot,
+        player_index: int
+    ) -> int:
+        """
+        Sends the snapshot to the player, as a delta against the last
+        one it acknowledged when possible.
+        """
+        message = self.snapshot_histories[player_index].encode(
+            snapshot,
+            self.room_id
+        )
+        return self.sendToPlayer(message, player_index)
+
+    def queue_to_player(self, msg, player_index) -> None:
+        """
+        Like `sendToPlayer`, but the message is only queued, and sent
+        with the rest of the tick's messages when the endpoint is flushed
+        """
+        self.endpoint.queue(msg, self.player_addrs[player_index])
+
+    def broadcast_snapshot(
+        self,
+        snapshot: library.protocol.Snapshot,
+        event: bytes = None
+    ) -> int:
+        """
+        Queues the snapshot (and the encoded event, if any) for every
+        player.  Players who acknowledged the same snapshot get the same
+        encoding, so the snapshot is encoded once for all players in
+        sync.
+        @returns Number of encodings made
+        """
+        encoded = {}
+        for (player_index, history) in enumerate(self.snapshot_histories):
+            message = history.encode(snapshot, self.room_id, encoded)
+            self.queue_to_player(message, player_index)
+            if event is not None:
+                self.queue_to_player(event, player_index)
+        return len(encoded)
+
+    def snapshot_report(self) -> str:
+        """Bytes of snapshots sent per tick to each player"""
+        return "\n".join(
+            "Player {}: {:.1f} B/tick, {} snapshots ({} full)".format(
+                player_index,
+                history.bytes_per_tick(),
+                history.sent,
+                history.full_sent
+            )
+            for (player_index, history) in enumerate(self.snapshot_histories)
+        )
+
 
-    
     def start_updating(self):
         """
-        Continuously updates any recieved player information.  Blocks,
-        so it makes sense to put it in different thread.
+        Continuously updates any recieved player information.  Blocks
+        while running the event loop, the server's ticks should rather
+        run on the loop too (see `GameServer.run`).
         """
-        while True:
-            msg, index = self.recv_from_any()
-            self.save_player_data(index, msg)
+        self.loop.run_forever()
 
     
-    def get_player_info(self, player_index) -> Dict:
+    def get_player_info(
+        self,
+        player_index
+    ) -> library.protocol.InputMessage:
         """
         Get the latest recieved information from given player.
         """
         return self.player_data[player_index]
 
+
+    def next_input(self, player_index) -> float:
+        """
+        Consumes the player's input for this tick from its jitter buffer.
+        @returns The input, the previous one if it's missing, None
+        before the first one
+        """
+        return self.jitter_buffers[player_index].pop()
+
     
     def recv_from_any(self) -> Tuple[bytes, int]:
         """
-        Recieves message and gives it with the index of sending player.
+        Runs the event loop until the next message from a player
+        (which is saved as any other).
+        @returns The message with the index of sending player
         """
-        while True:
-            msg, addr = self.connection_socket.recvfrom(1024)
-            try:
-                index = self.player_addrs.index(addr)
-            except ValueError:
-                print("Recieved message from unexpected address '{}'!".format(addr))
-                continue
-            # Index was found, return the message
-            return (msg, index)
+        self.next_message = self.loop.create_future()
+        try:
+            return self.loop.run_until_complete(self.next_message)
+        finally:
+            self.next_message = None
 
 
     def save_player_data(
@@ -94,5 +335,23 @@ class Communication:
         player_index: int,
         player_data: bytes
     ) -> None:
-        data_loaded = json.loads(player_data)
-        self.player_data[player_index] = data_loaded
+        try:
+            message = library.protocol.decode(player_data)
+        except library.protocol.ProtocolError as error:
+            print("Invalid message from player {}: {}".format(player_index, error))
+            return
+        if isinstance(message, library.protocol.InputMessage):
+            self.jitter_buffers[player_index].add(
+                message.sequence,
+                message.inputs
+            )
+            latest = self.player_data[player_index]
+            if latest is None or message.sequence > latest.sequence:
+                self.player_data[player_index] = message
+            self.snapshot_histories[player_index].ack(message.tick)
+
+
+    def close(self) -> None:
+        """Closes the endpoint if it was opened by this object"""
+        if self.owns_endpoint:
+            self.endpoint.close()
@@ -1,48 +1,236 @@
-import pygame
-import pygame.freetype
+import asyncio
+import signal
+import time
 
-import server.communication
-import server.gameState
-import library.constants
+import server.metrics
+import server.rooms
+import server.serverSettings
+import server.sessions
+import server.transport
+import library.profiling
+import library.protocol
+import library.scheduler
 
 class GameServer:
+    """
+    Hosts the rooms (matches) of one process.  All of them share one
+    UDP endpoint, senders are resolved to their rooms and players
+    through their sessions (the room id in the header picks the room
+    only in handshakes), and one scheduler steps every running room per
+    frame.
+    """
     quit_game: bool
-    status: library.constants.GameStatus
-    game_state: server.gameState.GameState
-    clock: pygame.time.Clock
-    connection: server.communication.Communication
+    # Wakes the loop up at TICK_RATE_LIMIT
+    scheduler: library.scheduler.TickScheduler
+    loop: asyncio.AbstractEventLoop
+    endpoint: server.transport.DatagramServer
+    rooms: server.rooms.RoomRegistry
+    sessions: server.sessions.SessionTable
+    # Latency of the phases of each tick and of the network
+    metrics: server.metrics.Metrics
+    profiler: library.profiling.TickProfiler
 
     def __init__(self):
-        pygame.init()
-        self.clock = pygame.time.Clock()
+        self.scheduler = library.scheduler.TickScheduler()
         self.quit_game = False
-        self.game_state = server.gameState.GameState()
-        self.status = library.constants.GameStatus.PAUSE
+        self.metrics = server.metrics.Metrics()
+        self.profiler = library.profiling.TickProfiler('server')
+        self.loop = asyncio.new_event_loop()
+        self.endpoint = self.loop.run_until_complete(
+            server.transport.open_server(
+                self.datagram_received,
+                (server.serverSettings.BIND_IP, server.serverSettings.BIND_PORT)
+            )
+        )
+        self.rooms = server.rooms.RoomRegistry(
+            self.loop,
+            self.endpoint,
+            self.metrics
+        )
+        self.sessions = server.sessions.SessionTable(time.perf_counter_ns())
 
-        # Wait for 2 clients
-        self.connection = server.communication.Communication()
-        
-        self.status = library.constants.GameStatus.RUNNING
-        
+    def datagram_received(self, msg: bytes, addr) -> None:
+        """Routes the datagram through the sender's session to its room"""
+        start = time.perf_counter_ns()
+        session = self.sessions.lookup(addr)
+        if session is None:
+            self.handshake(msg, addr, start)
+            return
+        session.last_seen = start
+        room = self.rooms.get(session.room_id)
+        if (len(msg) > 1
+                and msg[1] == library.protocol.MessageType.HANDSHAKE):
+            # The client didn't get its welcome and handshakes again
+            try:
+                library.protocol.decode(msg)
+            except library.protocol.ProtocolError:
+                return
+            self.welcome(room, session)
+            return
+        self.metrics.record('recv', time.perf_counter_ns() - start)
+        room.connection.player_message(session.player_index, msg)
 
-    def process_input(self):
-        # get input from clients?
-        pass
+    def handshake(self, msg: bytes, addr, now: int) -> None:
+        """
+        Connects a sender without a session.  A handshake with a known
+        token moves that session to the sender, otherwise the sender
+        joins the room it asks for (or any room) as a new player.
+        """
+        try:
+            room_id = library.protocol.room_of(msg)
+            message = library.protocol.decode(msg)
+        except library.protocol.ProtocolError:
+            return
+        if not isinstance(message, library.protocol.Handshake):
+            return
+        session = None
+        if message.token:
+            session = self.sessions.reconnect(message.token, addr, now)
+        if session is not None:
+            room = self.rooms.get(session.room_id)
+            room.connection.rebind_player(session.player_index, addr)
+        else:
+            if room_id == library.protocol.ANY_ROOM:
+                room = self.rooms.open_room()
+                if room is None:
+                    print("No free room for '{}'!".format(addr))
+                    return
+            else:
+                room = self.rooms.get(room_id)
+                if room is None:
+                    return
+            index = room.connection.add_player(msg, addr)
+            if index is None:
+                return
+            session = self.sessions.add(addr, room.room_id, index, now)
+            room.sessions.append(session)
+            if room.connection.is_full():
+                room.start()
+        self.welcome(room, session)
 
-    def update_state(self):
-        self.clock.tick(library.constants.TICK_RATE_LIMIT)
-        if self.status == library.constants.GameStatus.RUNNING:
-            self.game_state.tick_state(self.clock.get_time())
-        
+    def welcome(
+        self,
+        room: server.rooms.Room,
+        session: server.sessions.Session
+    ) -> None:
+        """Answers a handshake with the session's token and player index"""
+        room.connection.sendToPlayer(
+            library.protocol.encode(
+                library.protocol.Welcome(session.token, session.player_index),
+                room.room_id
+            ),
+            session.player_index
+        )
 
-    def render(self):
-        # print something?
-        pass
+    def close_room(self, room: server.rooms.Room) -> None:
+        """Ends the room's match and disconnects its players"""
+        for session in room.sessions:
+            self.sessions.remove(session)
+        self.rooms.reclaim(room.room_id)
 
+    def expire_sessions(self) -> None:
+        """Closes the rooms of players who went idle"""
+        for session in self.sessions.expire(time.perf_counter_ns()):
+            room = self.rooms.get(session.room_id)
+            if room is not None:
+                self.close_room(room)
+
+    async def wait_for_tick(self):
+        # Datagrams are handled while sleeping on the event loop, only
+        # the final spin blocks it
+        await asyncio.sleep(self.scheduler.sleep_ns() * 1e-9)
+        self.scheduler.wait()
 
     def run(self):
+        """
+        Runs the ticks on the event loop handling the network, until
+        `quit_game` is set (Ctrl+C sets it too)
+        """
+        try:
+            self.loop.add_signal_handler(signal.SIGINT, self.stop)
+        except NotImplementedError:
+            # No signal handlers on Windows loops, Ctrl+C interrupts the
+            # loop instead
+            pass
+        try:
+            self.loop.run_until_complete(self.tick_loop())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def stop(self) -> None:
+        """Ends the run after the current tick"""
+        self.quit_game = True
+
+    def shutdown(self) -> None:
+        """Reports on the run, then closes the rooms and the endpoint"""
+        self.profiler.close()
+        print(self.metrics.report())
+        print(self.scheduler.stats.report())
+        print(self.rooms.report())
+        print("{} sessions, {} timed out, {} reconnected".format(
+            len(self.sessions),
+            self.sessions.evicted,
+            self.sessions.reconnected
+        ))
+        if server.serverSettings.METRICS_DUMP_PATH is not None:
+            self.metrics.dump(server.serverSettings.METRICS_DUMP_PATH)
+        self.rooms.close()
+        self.endpoint.close()
+
+    async def tick_loop(self):
+        metrics = self.metrics
+        # Don't count the time spent connecting the clients as lag
+        self.scheduler.start()
         while not self.quit_game:
-            self.process_input()
-            self.update_state()
-            self.render()
-        pygame.quit()
+            self.profiler.tick()
+            # Waiting isn't a part of the tick's work
+            start = time.perf_counter_ns()
+            await self.wait_for_tick()
+            metrics.record('wait', time.perf_counter_ns() - start)
+
+            metrics.start_tick()
+            self.expire_sessions()
+            self.step_rooms(self.scheduler.frame_ms)
+            metrics.end_tick()
+
+    def step_rooms(self, frame_ms: float):
+        """
+        Steps every running room by the frame, measuring the cost of
+        each room and of each phase over all rooms, then sends what the
+        rooms broadcast
+        """
+        metrics = self.metrics
+        input_ns = 0
+        update_ns = 0
+        render_ns = 0
+        encodings = 0
+        finished = []
+        for room in self.rooms.running():
+            start = time.perf_counter_ns()
+            room.process_input()
+            input_end = time.perf_counter_ns()
+            room.update_state(frame_ms)
+            update_end = time.perf_counter_ns()
+            encodings += room.render()
+            end = time.perf_counter_ns()
+            input_ns += input_end - start
+            update_ns += update_end - input_end
+            render_ns += end - update_end
+            room.tick_cost.record(end - start)
+            metrics.record('room_tick', end - start)
+            if room.is_finished():
+                finished.append(room)
+        metrics.record_phase('process_input', input_ns)
+        metrics.record_phase('update_state', update_ns)
+        metrics.record_phase('render', render_ns)
+        metrics.count('snapshot_encodes', encodings)
+
+        start = time.perf_counter_ns()
+        (calls, sent_bytes) = self.endpoint.flush()
+        metrics.record_phase('flush', time.perf_counter_ns() - start)
+        metrics.count('send_calls', calls)
+        metrics.count('send_bytes', sent_bytes)
+        for room in finished:
+            self.close_room(room)
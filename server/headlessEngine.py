@@ -0,0 +1,246 @@
+from typing import Callable, Dict, List, NamedTuple, Tuple
+import argparse
+import random
+import time
+
+import library.constants
+import library.customObjects
+import server.gameState
+
+
+# Sets desired move of the player according to the game state.  Gets a
+# random generator owned by the match, so that matches are reproducible
+Policy = Callable[
+    [
+        server.gameState.GameState,
+        library.customObjects.Player,
+        random.Random
+    ],
+    None
+]
+# Creates the policy of one player for one match, so that policies
+# keeping state between ticks start every match afresh
+PolicyFactory = Callable[[], Policy]
+
+
+def move_towards(
+    game_state: server.gameState.GameState,
+    player: library.customObjects.Player,
+    target_y: float,
+    max_speed: float
+) -> None:
+    """
+    Sets desired move of the player so that its center goes to `target_y`
+    (clamped to the field), but not faster than `max_speed` per tick.
+    """
+    y_limit = game_state.field_size[1] - player.y_scale
+    y_desired = target_y - player.y_scale/2
+    y_desired = max(0, min(y_desired, y_limit))
+    move = max(-max_speed, min(y_desired - player.y_pos, max_speed))
+    player.set_desired_move(0.0, move)
+
+
+def idle_policy(game_state, player, rng) -> None:
+    player.set_desired_move(0.0, 0.0)
+
+
+def tracking_policy(game_state, player, rng) -> None:
+    """Follows the ball as fast as allowed"""
+    move_towards(
+        game_state,
+        player,
+        game_state.ball.y_pos,
+        library.constants.HEADLESS_PADDLE_SPEED
+    )
+
+
+class NoisyTrackingPolicy:
+    """
+    Follows the ball, but sometimes misjudges where it is (the error is
+    redrawn about every 100 ticks)
+    """
+    # Current misjudgement of the ball's position
+    aim_error: float
+
+    def __init__(self):
+        self.aim_error = 0.0
+
+    def __call__(self, game_state, player, rng) -> None:
+        if rng.random() < 0.01:
+            self.aim_error = rng.gauss(0.0, library.constants.PLAYER_SIZE[1])
+        move_towards(
+            game_state,
+            player,
+            game_state.ball.y_pos + self.aim_error,
+            library.constants.HEADLESS_PADDLE_SPEED
+        )
+
+
+def random_policy(game_state, player, rng) -> None:
+    player.set_desired_move(
+        0.0,
+        rng.uniform(
+            -library.constants.HEADLESS_PADDLE_SPEED,
+            library.constants.HEADLESS_PADDLE_SPEED
+        )
+    )
+
+
+def _stateless(policy: Policy) -> PolicyFactory:
+    return lambda: policy
+
+
+POLICIES: Dict[str, PolicyFactory] = {
+    'idle': _stateless(idle_policy),
+    'tracking': _stateless(tracking_policy),
+    'noisy': NoisyTrackingPolicy,
+    'random': _stateless(random_policy),
+}
+
+
+class MatchResult(NamedTuple):
+    seed: int
+    player_score: int
+    enemy_score: int
+    ticks: int
+    # 1 or 2 for the winning player, 0 if the tick limit was reached
+    winner: int
+
+
+class EngineReport(NamedTuple):
+    results: List[MatchResult]
+    ticks: int
+    seconds: float
+
+    @property
+    def ticks_per_second(self) -> float:
+        if self.seconds == 0:
+            return 0.0
+        return self.ticks / self.seconds
+
+    def summary(self) -> str:
+        wins = [0, 0, 0]
+        for result in self.results:
+            wins[result.winner] += 1
+        return (
+            "{} matches, {} ticks in {:.3f} s ({:.0f} ticks/s)\n"
+            "Player 1 wins: {}, player 2 wins: {}, unfinished: {}".format(
+                len(self.results),
+                self.ticks,
+                self.seconds,
+                self.ticks_per_second,
+                wins[1],
+                wins[2],
+                wins[0]
+            )
+        )
+
+
+class HeadlessEngine:
+    """
+    Plays matches of `server.gameState.GameState` as fast as possible:
+    no display, no clock, inputs are generated by policies.  Every tick
+    simulates one fixed physics step.
+    """
+    # Policies are created for each match
+    player_policy: PolicyFactory
+    enemy_policy: PolicyFactory
+    score_limit: int
+    max_ticks: int
+    step_ms: float
+
+    def __init__(
+        self,
+        player_policy: str = 'noisy',
+        enemy_policy: str = 'noisy',
+        score_limit: int = library.constants.HEADLESS_SCORE_LIMIT,
+        max_ticks: int = library.constants.HEADLESS_MAX_TICKS,
+        step_ms: float = library.constants.PHYSICS_STEP_MS
+    ):
+        self.player_policy = POLICIES[player_policy]
+        self.enemy_policy = POLICIES[enemy_policy]
+        self.score_limit = score_limit
+        self.max_ticks = max_ticks
+        self.step_ms = step_ms
+
+    def run_match(
+        self,
+        seed: int,
+        field_size: Tuple[float, float] = library.constants.GAME_FIELD_SIZE
+    ) -> MatchResult:
+        rng = random.Random(seed)
+        game_state = server.gameState.GameState(field_size)
+        game_state.log_goals = False
+        player = game_state.player_brick
+        enemy = game_state.enemy_brick
+        player_policy = self.player_policy()
+        enemy_policy = self.enemy_policy()
+        ticks = 0
+        while (ticks < self.max_ticks
+               and game_state.player_score < self.score_limit
+               and game_state.enemy_score < self.score_limit):
+            player_policy(game_state, player, rng)
+            enemy_policy(game_state, enemy, rng)
+            game_state.tick_state(self.step_ms)
+            ticks += 1
+
+        winner = 0
+        if game_state.player_score >= self.score_limit:
+            winner = 1
+        elif game_state.enemy_score >= self.score_limit:
+            winner = 2
+        return MatchResult(
+            seed,
+            game_state.player_score,
+            game_state.enemy_score,
+            ticks,
+            winner
+        )
+
+    def run(self, matches: int, first_seed: int = 0) -> EngineReport:
+        results = []
+        start = time.perf_counter()
+        for seed in range(first_seed, first_seed + matches):
+            results.append(self.run_match(seed))
+        seconds = time.perf_counter() - start
+        return EngineReport(
+            results,
+            sum(result.ticks for result in results),
+            seconds
+        )
+
+
+def main(argv: List[str] = None) -> EngineReport:
+    parser = argparse.ArgumentParser(
+        description="Play matches headlessly, faster than real time"
+    )
+    parser.add_argument('--matches', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the first match")
+    parser.add_argument('--player', choices=POLICIES, default='noisy')
+    parser.add_argument('--enemy', choices=POLICIES, default='noisy')
+    parser.add_argument('--score-limit', type=int,
+                        default=library.constants.HEADLESS_SCORE_LIMIT)
+    parser.add_argument('--max-ticks', type=int,
+                        default=library.constants.HEADLESS_MAX_TICKS)
+    parser.add_argument('--verbose', action='store_true',
+                        help="Print result of each match")
+    args = parser.parse_args(argv)
+
+    engine = HeadlessEngine(
+        args.player,
+        args.enemy,
+        args.score_limit,
+        args.max_ticks
+    )
+    report = engine.run(args.matches, args.seed)
+    if args.verbose:
+        for result in report.results:
+            print("Seed {}: {}:{} in {} ticks".format(
+                result.seed,
+                result.player_score,
+                result.enemy_score,
+                result.ticks
+            ))
+    print(report.summary())
+    return report
@@ -0,0 +1,149 @@
+from array import array
+from typing import Sequence
+
+import server.serverSettings
+
+
+class JitterBuffer:
+    """
+    Inputs of one player by their sequence numbers, consumed one per
+    tick.  Consuming starts once `delay` inputs are buffered, which
+    absorbs arrival jitter, and a buffer grown beyond `max_depth` (after
+    a burst) is skipped forward so it doesn't keep adding latency.
+
+    Inputs are kept in a ring indexed by sequence modulo its size.  A
+    slot holds the sequence number of its input, or `-2 - sequence` if
+    that input was missing when its tick was simulated, so that it can
+    be told apart when it arrives late.  Another ring of the same size
+    holds the sequence numbers of the received packets (of their last
+    inputs), to tell duplicated packets from reordered ones.
+    """
+    sequences: array
+    values: array
+    packets: array
+    delay: int
+    max_depth: int
+    # Sequence of the input to be consumed next, None before the first
+    # input arrives
+    next_sequence: int
+    # Newest sequence received
+    newest: int
+    # Whether consuming started
+    started: bool
+    # Input applied last, repeated while inputs are missing
+    last_input: float
+    # Inputs applied
+    applied: int
+    # Ticks whose input wasn't there, the last input was repeated
+    missing: int
+    # Inputs which arrived after their tick was simulated without them
+    late: int
+    # Inputs thrown away unapplied, skipped to cut latency or too far
+    # ahead to fit the buffer
+    dropped: int
+    # Packets which arrived after a newer one
+    reordered: int
+    # Packets received more than once
+    duplicated: int
+
+    def __init__(
+        self,
+        size: int = server.serverSettings.JITTER_BUFFER_SIZE,
+        delay: int = server.serverSettings.JITTER_BUFFER_DELAY,
+        max_depth: int = server.serverSettings.JITTER_BUFFER_MAX_DEPTH
+    ):
+        self.sequences = array('q', [-1])*size
+        self.values = array('d', [0.0])*size
+        self.packets = array('q', [-1])*size
+        self.delay = delay
+        self.max_depth = max_depth
+        self.next_sequence = None
+        self.newest = -1
+        self.started = False
+        self.last_input = None
+        self.applied = 0
+        self.missing = 0
+        self.late = 0
+        self.dropped = 0
+        self.reordered = 0
+        self.duplicated = 0
+
+    def depth(self) -> int:
+        """Number of ticks buffered ahead of the next one"""
+        if self.next_sequence is None:
+            return 0
+        return max(0, self.newest - self.next_sequence + 1)
+
+    def add(self, sequence: int, inputs: Sequence[float]) -> None:
+        """
+        Adds the inputs of a packet, `sequence` being the number of the
+        last of them (the others precede it)
+        """
+        if self.next_sequence is None:
+            self.next_sequence = sequence - len(inputs) + 1
+        size = len(self.sequences)
+        packet_slot = sequence % size
+        if self.packets[packet_slot] == sequence:
+            self.duplicated += 1
+        else:
+            self.packets[packet_slot] = sequence
+            if sequence < self.newest:
+                self.reordered += 1
+        first = sequence - len(inputs) + 1
+        for (offset, value) in enumerate(inputs):
+            input_sequence = first + offset
+            slot = input_sequence % size
+            stored = self.sequences[slot]
+            if stored == input_sequence:
+                # Redundant copy
+                continue
+            if input_sequence < self.next_sequence:
+                if stored == -2 - input_sequence:
+                    self.late += 1
+                    # Count it once
+                    self.sequences[slot] = input_sequence
+                continue
+            if input_sequence >= self.next_sequence + size:
+                # Would overwrite inputs not consumed yet
+                self.dropped += 1
+                continue
+            self.sequences[slot] = input_sequence
+            self.values[slot] = value
+            if input_sequence > self.newest:
+                self.newest = input_sequence
+
+    def pop(self) -> float:
+        """
+        Consumes the input of this tick.
+        @returns The input, the last one if it's missing, None if there
+        hasn't been any yet
+        """
+        if self.next_sequence is None:
+            return None
+        if not self.started:
+            if self.depth() < self.delay:
+                return self.last_input
+            self.started = True
+        if self.depth() == 0:
+            # Starved, the client is behind, don't run ahead of it
+            self.missing += 1
+            return self.last_input
+        excess = self.depth() - self.max_depth
+        if excess > 0:
+            # Skip back to the target delay
+            skipped = excess + self.max_depth - self.delay
+            size = len(self.sequences)
+            for sequence in range(self.next_sequence, self.next_sequence + skipped):
+                if self.sequences[sequence % size] == sequence:
+                    self.dropped += 1
+            self.next_sequence += skipped
+        size = len(self.sequences)
+        slot = self.next_sequence % size
+        if self.sequences[slot] == self.next_sequence:
+            self.last_input = self.values[slot]
+            self.applied += 1
+        else:
+            self.sequences[slot] = -2 - self.next_sequence
+            self.missing += 1
+        self.next_sequence += 1
+        return self.last_input
@@ -0,0 +1,257 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Tuple
+import json
+import threading
+
+import library.constants
+
+
+def _default_bounds() -> List[int]:
+    """
+    Upper bounds (ns) of histogram buckets: 4 buckets per doubling from
+    1 us to about 2 s, so percentiles are off by at most 19%
+    """
+    return [int(1000 * 2**(i/4)) for i in range(4*21 + 1)]
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with fixed buckets.  Recording is a binary
+    search and an increment, nothing is allocated, so it can be done
+    on every tick.
+    """
+    name: str
+    # Upper bounds of the buckets in ns, the last bucket (not listed) is
+    # for everything longer
+    bounds: List[int]
+    counts: array
+    count: int
+    total_ns: int
+    max_ns: int
+
+    def __init__(self, name: str, bounds: List[int] = None):
+        self.name = name
+        self.bounds = bounds if bounds is not None else _default_bounds()
+        self.counts = array('Q', bytes(8*(len(self.bounds) + 1)))
+        self.reset()
+
+    def reset(self) -> None:
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns: int) -> None:
+        self.counts[bisect_left(self.bounds, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Upper bound of the bucket holding the given fraction of the
+        recorded durations (never more than the maximum)
+        """
+        if self.count == 0:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for (i, count) in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if i == len(self.bounds):
+                    return self.max_ns
+                return min(self.bounds[i], self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean_us': self.total_ns / self.count * 1e-3 if self.count else 0.0,
+            'p50_us': self.percentile(0.5) * 1e-3,
+            'p99_us': self.percentile(0.99) * 1e-3,
+            'max_us': self.max_ns * 1e-3,
+        }
+
+
+class TickCounter:
+    """Amount of something done per tick, e.g. datagrams sent"""
+    name: str
+    ticks: int
+    total: int
+    max: int
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ticks = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        self.ticks += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'ticks': self.ticks,
+            'total': self.total,
+            'mean_per_tick': self.total / self.ticks if self.ticks else 0.0,
+            'max_per_tick': self.max,
+        }
+
+
+class SlowTick(NamedTuple):
+    tick: int
+    duration_ns: int
+    # Duration of each phase of the tick
+    phases: Tuple[Tuple[str, int], ...]
+
+
+class Metrics:
+    """
+    Latency histograms of the server's phases.  A tick is made of the
+    phases recorded with `record_phase` between `start_tick` and
+    `end_tick`.  Ticks longer than the budget are counted as overruns
+    and the last of them are kept with their per-phase breakdown.
+    Other histograms (like network paths, recorded from other threads)
+    are filled with `record`, amounts per tick with `count`.
+    """
+    histograms: Dict[str, LatencyHistogram]
+    counters: Dict[str, TickCounter]
+    tick_budget_ns: int
+    ticks: int
+    overruns: int
+    slow_ticks: Deque[SlowTick]
+    # Phases of the current tick
+    tick_phases: List[Tuple[str, int]]
+    lock: threading.Lock
+
+    def __init__(
+        self,
+        tick_budget_ns: int = 10**9 // library.constants.TICK_RATE_LIMIT,
+        slow_ticks_kept: int = 16
+    ):
+        self.histograms = {}
+        self.counters = {}
+        self.tick_budget_ns = tick_budget_ns
+        self.ticks = 0
+        self.overruns = 0
+        self.slow_ticks = deque(maxlen=slow_ticks_kept)
+        self.tick_phases = []
+        self.lock = threading.Lock()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(
+                    name,
+                    LatencyHistogram(name)
+                )
+        return histogram
+
+    def record(self, name: str, duration_ns: int) -> None:
+        self.histogram(name).record(duration_ns)
+
+    def count(self, name: str, value: int) -> None:
+        """Records the amount of something done in this tick"""
+        counter = self.counters.get(name)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(name, TickCounter(name))
+        counter.record(value)
+
+    def start_tick(self) -> None:
+        self.tick_phases.clear()
+
+    def record_phase(self, name: str, duration_ns: int) -> None:
+        self.histogram(name).record(duration_ns)
+        self.tick_phases.append((name, duration_ns))
+
+    def end_tick(self) -> None:
+        duration_ns = 0
+        for (_, phase_ns) in self.tick_phases:
+            duration_ns += phase_ns
+        self.histogram('tick').record(duration_ns)
+        if duration_ns > self.tick_budget_ns:
+            self.overruns += 1
+            self.slow_ticks.append(SlowTick(
+                self.ticks,
+                duration_ns,
+                tuple(self.tick_phases)
+            ))
+        self.ticks += 1
+
+    def snapshot(self) -> Dict:
+        """Summary of everything recorded so far, safe to call anytime"""
+        with self.lock:
+            histograms = list(self.histograms.values())
+            counters = list(self.counters.values())
+        return {
+            'ticks': self.ticks,
+            'tick_budget_us': self.tick_budget_ns * 1e-3,
+            'overruns': self.overruns,
+            'phases': {
+                histogram.name: histogram.summary()
+                for histogram in histograms
+            },
+            'counters': {
+                counter.name: counter.summary()
+                for counter in counters
+            },
+            'slow_ticks': [
+                {
+                    'tick': slow_tick.tick,
+                    'duration_us': slow_tick.duration_ns * 1e-3,
+                    'phases_us': {
+                        name: duration_ns * 1e-3
+                        for (name, duration_ns) in slow_tick.phases
+                    },
+                }
+                for slow_tick in list(self.slow_ticks)
+            ],
+        }
+
+    def report(self) -> str:
+        snapshot = self.snapshot()
+        lines = [
+            "{} ticks, {} over the budget of {:.0f} us".format(
+                snapshot['ticks'],
+                snapshot['overruns'],
+                snapshot['tick_budget_us']
+            ),
+            "{:16s} {:>8s} {:>10s} {:>10s} {:>10s}".format(
+                "phase", "count", "p50 us", "p99 us", "max us"
+            ),
+        ]
+        for (name, summary) in snapshot['phases'].items():
+            lines.append("{:16s} {:8d} {:10.1f} {:10.1f} {:10.1f}".format(
+                name,
+                summary['count'],
+                summary['p50_us'],
+                summary['p99_us'],
+                summary['max_us']
+            ))
+        if snapshot['counters']:
+            lines.append("{:16s} {:>8s} {:>10s} {:>10s} {:>10s}".format(
+                "per tick", "ticks", "mean", "max", "total"
+            ))
+        for (name, summary) in snapshot['counters'].items():
+            lines.append("{:16s} {:8d} {:10.1f} {:10d} {:10d}".format(
+                name,
+                summary['ticks'],
+                summary['mean_per_tick'],
+                summary['max_per_tick'],
+                summary['total']
+            ))
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2)
@@ -0,0 +1,262 @@
+from array import array
+from typing import Iterator, NamedTuple, Tuple
+import mmap
+import queue
+import struct
+import threading
+
+import server.gameState
+import server.serverSettings
+
+
+# Replay file layout:
+#   header, then blocks of `keyframe_interval` ticks.  Each block starts
+#   with a keyframe (`GameState.save` buffer taken before its first
+#   tick) followed by one record per tick.  All blocks but the last one
+#   are full, so the block holding any tick is found by arithmetic.
+#
+# Header: magic, format version, keyframe interval, number of values in
+# a keyframe, field width and height
+HEADER = struct.Struct('<4sHHIdd')
+MAGIC = b'PRPL'
+FORMAT_VERSION = 1
+# Tick record: tick number, length of the tick (ms) and desired moves
+# (x, y) of the player and the enemy
+RECORD = struct.Struct('<I5d')
+
+
+class ReplayHeader(NamedTuple):
+    keyframe_interval: int
+    keyframe_size: int
+    field_size: Tuple[float, float]
+
+    def block_size(self) -> int:
+        """Size of a full block in bytes"""
+        return 8*self.keyframe_size + RECORD.size*self.keyframe_interval
+
+
+class TickRecord(NamedTuple):
+    tick: int
+    t: float
+    player_move: Tuple[float, float]
+    enemy_move: Tuple[float, float]
+
+
+class ReplayWriter:
+    """
+    Records a match as it is played.  `record_tick` only packs the
+    inputs into the current block, whole blocks are handed over to a
+    background thread which writes them, so the tick loop never waits
+    for the disk.
+    """
+    game_state: server.gameState.GameState
+    header: ReplayHeader
+    # Number of the next tick to be recorded
+    tick: int
+    # Block being filled
+    block: bytearray
+    block_offset: int
+    keyframe: array
+    blocks: queue.SimpleQueue
+    thread: threading.Thread
+
+    def __init__(
+        self,
+        path: str,
+        game_state: server.gameState.GameState,
+        keyframe_interval: int = server.serverSettings.REPLAY_KEYFRAME_INTERVAL
+    ):
+        self.game_state = game_state
+        self.keyframe = game_state.new_save_buffer()
+        self.header = ReplayHeader(
+            keyframe_interval,
+            len(self.keyframe),
+            tuple(game_state.field_size)
+        )
+        self.tick = 0
+        self.block = bytearray(self.header.block_size())
+        self.block_offset = 0
+        self.blocks = queue.SimpleQueue()
+        file = open(path, 'wb')
+        file.write(HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            keyframe_interval,
+            self.header.keyframe_size,
+            *self.header.field_size
+        ))
+        self.thread = threading.Thread(
+            target=self._write_blocks,
+            args=(file,),
+            daemon=True
+        )
+        self.thread.start()
+
+    def record_tick(self, t: float) -> None:
+        """
+        Must be called right before `tick_state(t)`, with the players'
+        desired moves already set
+        """
+        if self.tick % self.header.keyframe_interval == 0:
+            self.game_state.save(self.keyframe)
+            keyframe = self.keyframe.tobytes()
+            self.block[0:len(keyframe)] = keyframe
+            self.block_offset = len(keyframe)
+        player_move = self.game_state.player_brick.desired_move
+        enemy_move = self.game_state.enemy_brick.desired_move
+        RECORD.pack_into(
+            self.block,
+            self.block_offset,
+            self.tick,
+            t,
+            player_move[0],
+            player_move[1],
+            enemy_move[0],
+            enemy_move[1]
+        )
+        self.block_offset += RECORD.size
+        self.tick += 1
+        if self.tick % self.header.keyframe_interval == 0:
+            self.blocks.put(bytes(self.block))
+
+    def close(self) -> None:
+        """Writes the unfinished block and waits until all is written"""
+        if self.tick % self.header.keyframe_interval != 0:
+            self.blocks.put(bytes(self.block[:self.block_offset]))
+        self.blocks.put(None)
+        self.thread.join()
+
+    def _write_blocks(self, file) -> None:
+        with file:
+            while True:
+                block = self.blocks.get()
+                if block is None:
+                    return
+                file.write(block)
+
+
+class ReplayReader:
+    """
+    Plays back a recorded match.  The file is memory-mapped, so opening
+    even a long replay is instant, and seeking to a tick loads the
+    keyframe before it and re-simulates at most `keyframe_interval`
+    ticks.
+    """
+    header: ReplayHeader
+    ticks: int
+    # State of the replay, before the tick `tick`
+    game_state: server.gameState.GameState
+    tick: int
+    keyframe: array
+    file: object
+    data: mmap.mmap
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            keyframe_interval,
+            keyframe_size,
+            field_width,
+            field_height
+        ) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("'{}' is not a supported replay".format(path))
+        self.header = ReplayHeader(
+            keyframe_interval,
+            keyframe_size,
+            (field_width, field_height)
+        )
+        # Count the ticks by the size of the file
+        body = len(self.data) - HEADER.size
+        (full_blocks, rest) = divmod(body, self.header.block_size())
+        self.ticks = full_blocks * keyframe_interval
+        if rest:
+            self.ticks += (rest - 8*keyframe_size) // RECORD.size
+        self.game_state = server.gameState.GameState(self.header.field_size)
+        self.game_state.log_goals = False
+        self.keyframe = array('d', bytes(8*keyframe_size))
+        self.tick = 0
+        if self.ticks > 0:
+            self.load_keyframe(0)
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def block_offset(self, tick: int) -> int:
+        """Position of the block holding the tick in the file"""
+        return (HEADER.size
+                + tick // self.header.keyframe_interval
+                * self.header.block_size())
+
+    def record(self, tick: int) -> TickRecord:
+        offset = (self.block_offset(tick)
+                  + 8*self.header.keyframe_size
+                  + tick % self.header.keyframe_interval * RECORD.size)
+        (
+            recorded_tick,
+            t,
+            player_x,
+            player_y,
+            enemy_x,
+            enemy_y
+        ) = RECORD.unpack_from(self.data, offset)
+        return TickRecord(
+            recorded_tick,
+            t,
+            (player_x, player_y),
+            (enemy_x, enemy_y)
+        )
+
+    def seek(self, tick: int) -> server.gameState.GameState:
+        """
+        Puts the game state to the moment before the given tick (`ticks`
+        for the end of the match)
+        @returns The game state
+        """
+        if not 0 <= tick <= self.ticks:
+            raise IndexError("Tick {} is out of the replay".format(tick))
+        # Going forward within the block doesn't need the keyframe
+        if not (self.tick <= tick
+                and (self.tick // self.header.keyframe_interval
+                     == tick // self.header.keyframe_interval)):
+            first_tick = tick - tick % self.header.keyframe_interval
+            if first_tick == self.ticks:
+                # The last block is full, start from the one before
+                first_tick -= self.header.keyframe_interval
+            self.load_keyframe(first_tick)
+        while self.tick < tick:
+            self.step()
+        return self.game_state
+
+    def load_keyframe(self, tick: int) -> None:
+        """Loads the keyframe of the block starting with the tick"""
+        offset = self.block_offset(tick)
+        self.keyframe[:] = array(
+            'd',
+            self.data[offset:offset + 8*self.header.keyframe_size]
+        )
+        self.game_state.load(self.keyframe)
+        # Keyframes are taken with the inputs of their tick already set,
+        # the records provide those
+        self.game_state.player_brick.set_desired_move(0.0, 0.0)
+        self.game_state.enemy_brick.set_desired_move(0.0, 0.0)
+        self.tick = tick
+
+    def step(self) -> TickRecord:
+        """Simulates the next tick of the replay"""
+        record = self.record(self.tick)
+        self.game_state.player_brick.set_desired_move(*record.player_move)
+        self.game_state.enemy_brick.set_desired_move(*record.enemy_move)
+        self.game_state.tick_state(record.t)
+        self.tick += 1
+        return record
+
+    def play(self) -> Iterator[server.gameState.GameState]:
+        """Yields the game state after each remaining tick"""
+        while self.tick < self.ticks:
+            self.step()
+            yield self.game_state
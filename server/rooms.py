@@ -0,0 +1,307 @@
+from typing import Dict, List
+import asyncio
+import os
+import time
+
+import library.constants
+import library.protocol
+import library.timestep
+import server.communication
+import server.gameState
+import server.metrics
+import server.replay
+import server.serverSettings
+import server.sessions
+import server.transport
+
+
+class Room:
+    """
+    One match hosted by the server: its game state, its players and
+    their connection.  The server steps all running rooms once per
+    frame.
+    """
+    room_id: int
+    # Rooms allocated before this one and it, ids are reused but these
+    # numbers aren't, so they tell the room's replay apart
+    match_number: int
+    status: library.constants.GameStatus
+    game_state: server.gameState.GameState
+    connection: server.communication.Communication
+    # Sessions of the players, by their indexes
+    sessions: List[server.sessions.Session]
+    # Splits frame time into fixed physics steps
+    timestep: library.timestep.FixedTimestep
+    # Records the match, None if recording is off or it hasn't started
+    replay: server.replay.ReplayWriter
+    # Number of physics ticks simulated, sent with snapshots
+    tick_number: int
+    # Scores last sent to the players
+    sent_scores: tuple
+    # Time the room takes per frame
+    tick_cost: server.metrics.LatencyHistogram
+
+    def __init__(
+        self,
+        room_id: int,
+        loop: asyncio.AbstractEventLoop,
+        endpoint: server.transport.DatagramServer,
+        metrics: server.metrics.Metrics,
+        cost_bounds: List[int] = None,
+        match_number: int = 0
+    ):
+        self.room_id = room_id
+        self.match_number = match_number
+        self.status = library.constants.GameStatus.PAUSE
+        self.game_state = server.gameState.GameState()
+        self.game_state.log_goals = False
+        self.connection = server.communication.Communication(
+            server.serverSettings.PLAYERS_PER_ROOM,
+            metrics=metrics,
+            loop=loop,
+            endpoint=endpoint,
+            room_id=room_id
+        )
+        self.sessions = []
+        self.timestep = library.timestep.FixedTimestep()
+        self.replay = None
+        self.tick_number = 0
+        self.sent_scores = (0, 0)
+        self.tick_cost = server.metrics.LatencyHistogram(
+            'room {}'.format(room_id),
+            cost_bounds
+        )
+
+    def start(self) -> None:
+        """Starts the match once all players are connected"""
+        self.status = library.constants.GameStatus.RUNNING
+        if server.serverSettings.REPLAY_DIR is not None:
+            os.makedirs(server.serverSettings.REPLAY_DIR, exist_ok=True)
+            self.replay = server.replay.ReplayWriter(
+                os.path.join(
+                    server.serverSettings.REPLAY_DIR,
+                    time.strftime("%Y%m%d-%H%M%S-room{}-{}.replay".format(
+                        self.room_id,
+                        self.match_number
+                    ))
+                ),
+                self.game_state
+            )
+
+    def is_running(self) -> bool:
+        return self.status == library.constants.GameStatus.RUNNING
+
+    def is_finished(self) -> bool:
+        limit = server.serverSettings.ROOM_SCORE_LIMIT
+        return (self.game_state.player_score >= limit
+                or self.game_state.enemy_score >= limit)
+
+    def process_input(self):
+        """Applies one buffered input of each player"""
+        paddles = (self.game_state.player_brick, self.game_state.enemy_brick)
+        for (index, paddle) in enumerate(paddles):
+            if index >= len(self.connection.jitter_buffers):
+                break
+            player_input = self.connection.next_input(index)
+            if player_input is None:
+                continue
+            # Inputs are positions of the paddle's center, clamped to
+            # the field
+            y_desired = player_input - library.constants.PLAYER_SIZE[1]/2
+            y_limit = self.game_state.field_size[1] - library.constants.PLAYER_SIZE[1]
+            y_desired = max(0, min(y_desired, y_limit))
+            paddle.set_desired_move(0, y_desired - paddle.y_pos)
+
+    def update_state(self, frame_ms: float):
+        if library.constants.FIXED_TIMESTEP:
+            steps = self.timestep.advance(frame_ms)
+            for _ in range(steps):
+                self.tick(self.timestep.step_ms)
+        else:
+            self.tick(frame_ms)
+
+    def tick(self, t):
+        if self.replay is not None:
+            self.replay.record_tick(t)
+        self.game_state.tick_state(t)
+        self.tick_number += 1
+
+    def render(self) -> int:
+        return self.broadcast_state()
+
+    def broadcast_state(self) -> int:
+        """
+        Queues the snapshot of this tick and any new score for the
+        players, they are sent when the server flushes its endpoint.
+        @returns Number of snapshot encodings made
+        """
+        game_state = self.game_state
+        ball = game_state.ball
+        scores = (game_state.player_score, game_state.enemy_score)
+        snapshot = library.protocol.Snapshot(
+            self.tick_number,
+            ball.x_pos,
+            ball.y_pos,
+            ball.x_vel,
+            ball.y_vel,
+            game_state.player_brick.y_pos,
+            game_state.enemy_brick.y_pos,
+            *scores
+        )
+        score_event = None
+        if scores != self.sent_scores:
+            score_event = library.protocol.encode(
+                library.protocol.ScoreEvent(self.tick_number, *scores),
+                self.room_id
+            )
+            self.sent_scores = scores
+        return self.connection.broadcast_snapshot(snapshot, score_event)
+
+    def close(self) -> None:
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+        self.connection.close()
+
+
+class RoomRegistry:
+    """
+    Rooms hosted by the server by their ids.  Ids of reclaimed rooms are
+    reused, lowest first, so they stay below `max_rooms` and fit the
+    packet header.  Players who don't ask for a particular room join
+    the room being filled.
+    """
+    loop: asyncio.AbstractEventLoop
+    endpoint: server.transport.DatagramServer
+    metrics: server.metrics.Metrics
+    max_rooms: int
+    rooms: Dict[int, Room]
+    # Ids not in use, in descending order so the lowest one is popped
+    free_ids: List[int]
+    # Room waiting for players, None if there is none
+    filling: Room
+    # Rooms allocated since the start and the most hosted at once
+    allocated: int
+    peak_rooms: int
+    # Bucket bounds shared by the cost histograms of all rooms
+    cost_bounds: List[int]
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        endpoint: server.transport.DatagramServer,
+        metrics: server.metrics.Metrics,
+        max_rooms: int = server.serverSettings.MAX_ROOMS
+    ):
+        self.loop = loop
+        self.endpoint = endpoint
+        self.metrics = metrics
+        self.max_rooms = max_rooms
+        self.rooms = {}
+        self.free_ids = list(reversed(range(max_rooms)))
+        self.filling = None
+        self.allocated = 0
+        self.peak_rooms = 0
+        self.cost_bounds = server.metrics.LatencyHistogram('').bounds
+
+    def get(self, room_id: int) -> Room:
+        """@returns The room, None if there is no room of the id"""
+        return self.rooms.get(room_id)
+
+    def allocate(self) -> Room:
+        """@returns New room, None if the server is full"""
+        if not self.free_ids:
+            return None
+        self.allocated += 1
+        room = Room(
+            self.free_ids.pop(),
+            self.loop,
+            self.endpoint,
+            self.metrics,
+            self.cost_bounds,
+            self.allocated
+        )
+        self.rooms[room.room_id] = room
+        self.peak_rooms = max(self.peak_rooms, len(self.rooms))
+        return room
+
+    def open_room(self) -> Room:
+        """
+        Room for a player who doesn't ask for a particular one.
+        @returns The room being filled, a new one if there is none, None
+        if the server is full
+        """
+        if self.filling is None or self.filling.connection.is_full():
+            self.filling = self.allocate()
+        return self.filling
+
+    def reclaim(self, room_id: int) -> None:
+        """Closes the room and makes its id available again"""
+        room = self.rooms.pop(room_id)
+        room.close()
+        if room is self.filling:
+            self.filling = None
+        # Keep the ids sorted descending, reclaiming is rare
+        self.free_ids.append(room_id)
+        self.free_ids.sort(reverse=True)
+
+    def running(self) -> List[Room]:
+        return [room for room in self.rooms.values() if room.is_running()]
+
+    def report(self, top: int = server.serverSettings.ROOM_REPORT_TOP) -> str:
+        """Numbers of rooms and the rooms taking the most time per tick"""
+        lines = ["{} rooms hosted, {} allocated since the start, peak {}".format(
+            len(self.rooms),
+            self.allocated,
+            self.peak_rooms
+        )]
+        histories = [
+            history
+            for room in self.rooms.values()
+            for history in room.connection.snapshot_histories
+        ]
+        sent = sum(history.sent for history in histories)
+        if sent:
+            lines.append("Snapshots: {:.1f} B/tick to {} clients, {} full".format(
+                sum(history.bytes_sent for history in histories) / sent,
+                len(histories),
+                sum(history.full_sent for history in histories)
+            ))
+        buffers = [
+            jitter_buffer
+            for room in self.rooms.values()
+            for jitter_buffer in room.connection.jitter_buffers
+        ]
+        if buffers:
+            lines.append(
+                "Inputs: {} applied, {} missing, {} late, {} dropped, "
+                "{} reordered and {} duplicated packets".format(
+                    sum(jitter_buffer.applied for jitter_buffer in buffers),
+                    sum(jitter_buffer.missing for jitter_buffer in buffers),
+                    sum(jitter_buffer.late for jitter_buffer in buffers),
+                    sum(jitter_buffer.dropped for jitter_buffer in buffers),
+                    sum(jitter_buffer.reordered for jitter_buffer in buffers),
+                    sum(jitter_buffer.duplicated for jitter_buffer in buffers)
+                )
+            )
+        rooms = sorted(
+            (room for room in self.rooms.values() if room.tick_cost.count),
+            key=lambda room: -room.tick_cost.total_ns / room.tick_cost.count
+        )
+        for room in rooms[:top]:
+            cost = room.tick_cost
+            lines.append(
+                "Room {}: {} frames, mean {:.1f} us, p99 {:.1f} us, "
+                "max {:.1f} us".format(
+                    room.room_id,
+                    cost.count,
+                    cost.total_ns / cost.count * 1e-3,
+                    cost.percentile(0.99) * 1e-3,
+                    cost.max_ns * 1e-3
+                )
+            )
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        for room_id in list(self.rooms):
+            self.reclaim(room_id)
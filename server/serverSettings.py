@@ -1,4 +1,40 @@
 # Specifies from which IPs to recieve messages
 BIND_IP = "127.0.0.1"
 # And at which port
-BIND_PORT = 5050
\ No newline at end of file
+BIND_PORT = 5050
+
+# Directory where every hosted match is recorded (None to not record)
+REPLAY_DIR = "replays"
+# Ticks between keyframes of a replay.  Seeking re-simulates at most
+# this many ticks, longer intervals make replays smaller
+REPLAY_KEYFRAME_INTERVAL = 256
+
+# Latency histograms of the server are written there on shutdown (None
+# to only print them)
+METRICS_DUMP_PATH = "server_metrics.json"
+
+# Rooms (concurrent matches) hosted by one server process
+MAX_ROOMS = 256
+PLAYERS_PER_ROOM = 2
+# A room's match ends, and the room is reclaimed, when a player reaches
+# this score
+ROOM_SCORE_LIMIT = 10
+# Number of the most expensive rooms listed in the shutdown report
+ROOM_REPORT_TOP = 5
+
+# Clients not heard from for this long are disconnected, which ends
+# their room's match.  Until then they may reconnect from another
+# address with the token they were given
+SESSION_IDLE_TIMEOUT_MS = 5000
+# Resolution of idle timeouts
+SESSION_WHEEL_SLOT_MS = 250
+
+# Inputs of each player are buffered and consumed one per tick.  Their
+# sequence numbers wrap around a ring of this size
+JITTER_BUFFER_SIZE = 32
+# Ticks buffered before consuming starts (added latency which absorbs
+# uneven arrival)
+JITTER_BUFFER_DELAY = 2
+# When more ticks than this are buffered, the buffer skips forward to
+# the delay above
+JITTER_BUFFER_MAX_DEPTH = 6
@@ -0,0 +1,152 @@
+from typing import Dict, List, Set, Tuple
+import secrets
+
+import server.serverSettings
+
+
+Address = Tuple[str, int]
+
+
+class Session:
+    """A connected client: where it is and which player it controls"""
+    # Secret the client reconnects with
+    token: int
+    addr: Address
+    room_id: int
+    player_index: int
+    # Time of the last datagram from the client (ns)
+    last_seen: int
+    # Slot of the timer wheel the session is in, None if not scheduled
+    wheel_slot: int
+
+    def __init__(
+        self,
+        token: int,
+        addr: Address,
+        room_id: int,
+        player_index: int,
+        now: int
+    ):
+        self.token = token
+        self.addr = addr
+        self.room_id = room_id
+        self.player_index = player_index
+        self.last_seen = now
+        self.wheel_slot = None
+
+
+class SessionTable:
+    """
+    Sessions by their addresses and tokens, both hashed, so resolving
+    the sender of a datagram doesn't depend on the number of clients.
+
+    Idle sessions are evicted by a timer wheel: each session sits in the
+    slot of its expiry, and only the slots whose time has passed are
+    visited.  Seeing a client only updates `last_seen`, a session found
+    in a passed slot which was seen since is moved to its new slot.
+    """
+    timeout_ns: int
+    slot_ns: int
+    by_addr: Dict[Address, Session]
+    by_token: Dict[int, Session]
+    slots: List[Set[Session]]
+    # Start of the first slot not yet visited (ns)
+    wheel_time: int
+    # Sessions evicted and reconnected since the start
+    evicted: int
+    reconnected: int
+
+    def __init__(
+        self,
+        now: int,
+        timeout_ms: float = server.serverSettings.SESSION_IDLE_TIMEOUT_MS,
+        slot_ms: float = server.serverSettings.SESSION_WHEEL_SLOT_MS
+    ):
+        self.timeout_ns = round(timeout_ms * 1e6)
+        self.slot_ns = round(slot_ms * 1e6)
+        self.by_addr = {}
+        self.by_token = {}
+        # The slots cover the timeout, plus one for the slot being
+        # visited
+        self.slots = [
+            set() for _ in range(-(-self.timeout_ns // self.slot_ns) + 1)
+        ]
+        self.wheel_time = now - now % self.slot_ns
+        self.evicted = 0
+        self.reconnected = 0
+
+    def __len__(self) -> int:
+        return len(self.by_token)
+
+    def lookup(self, addr: Address) -> Session:
+        """@returns Session of the address, None if there is none"""
+        return self.by_addr.get(addr)
+
+    def add(
+        self,
+        addr: Address,
+        room_id: int,
+        player_index: int,
+        now: int
+    ) -> Session:
+        token = 0
+        while token == 0 or token in self.by_token:
+            token = secrets.randbits(64)
+        session = Session(token, addr, room_id, player_index, now)
+        self.by_addr[addr] = session
+        self.by_token[token] = session
+        self.schedule(session)
+        return session
+
+    def reconnect(self, token: int, addr: Address, now: int) -> Session:
+        """
+        Moves the session of the token to a new address.
+        @returns The session, None if the token is unknown (or expired)
+        """
+        session = self.by_token.get(token)
+        if session is None:
+            return None
+        if self.by_addr.get(session.addr) is session:
+            del self.by_addr[session.addr]
+        session.addr = addr
+        session.last_seen = now
+        self.by_addr[addr] = session
+        self.reconnected += 1
+        return session
+
+    def remove(self, session: Session) -> None:
+        if self.by_addr.get(session.addr) is session:
+            del self.by_addr[session.addr]
+        self.by_token.pop(session.token, None)
+        if session.wheel_slot is not None:
+            self.slots[session.wheel_slot].discard(session)
+            session.wheel_slot = None
+
+    def schedule(self, session: Session) -> None:
+        """Puts the session into the slot of its expiry"""
+        expiry = max(session.last_seen + self.timeout_ns, self.wheel_time)
+        slot = (expiry // self.slot_ns) % len(self.slots)
+        self.slots[slot].add(session)
+        session.wheel_slot = slot
+
+    def expire(self, now: int) -> List[Session]:
+        """
+        Visits the slots whose time has passed, removing the sessions
+        idle for longer than the timeout.
+        @returns The removed sessions
+        """
+        expired = []
+        while self.wheel_time + self.slot_ns <= now:
+            slot = (self.wheel_time // self.slot_ns) % len(self.slots)
+            self.wheel_time += self.slot_ns
+            sessions = self.slots[slot]
+            self.slots[slot] = set()
+            for session in sessions:
+                session.wheel_slot = None
+                if session.last_seen + self.timeout_ns <= now:
+                    self.remove(session)
+                    expired.append(session)
+                else:
+                    self.schedule(session)
+        self.evicted += len(expired)
+        return expired
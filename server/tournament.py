@@ -0,0 +1,250 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+import argparse
+import os
+import time
+
+import library.constants
+import server.headlessEngine
+
+
+class MatchConfig(NamedTuple):
+    seed: int
+    player_policy: str = 'noisy'
+    enemy_policy: str = 'noisy'
+    field_size: Tuple[float, float] = library.constants.GAME_FIELD_SIZE
+    score_limit: int = library.constants.HEADLESS_SCORE_LIMIT
+    max_ticks: int = library.constants.HEADLESS_MAX_TICKS
+
+
+class MatchOutcome(NamedTuple):
+    config: MatchConfig
+    result: server.headlessEngine.MatchResult
+    # Process which played the match
+    worker_pid: int
+
+
+# Engines of the worker process, reused across matches and shards
+_engines: Dict[Tuple[str, str, int, int], server.headlessEngine.HeadlessEngine] = {}
+
+
+def _get_engine(config: MatchConfig) -> server.headlessEngine.HeadlessEngine:
+    key = (
+        config.player_policy,
+        config.enemy_policy,
+        config.score_limit,
+        config.max_ticks
+    )
+    engine = _engines.get(key)
+    if engine is None:
+        engine = server.headlessEngine.HeadlessEngine(*key)
+        _engines[key] = engine
+    return engine
+
+
+def warm_up_worker() -> None:
+    """
+    Initializer of worker processes.  Plays a short match so that
+    imports, cached field sides and the like are ready before the first
+    real shard arrives.
+    """
+    server.headlessEngine.HeadlessEngine(max_ticks=100).run_match(0)
+
+
+def play_shard(configs: List[MatchConfig]) -> List[MatchOutcome]:
+    """Plays the matches one after another in the current process"""
+    pid = os.getpid()
+    return [
+        MatchOutcome(
+            config,
+            _get_engine(config).run_match(config.seed, config.field_size),
+            pid
+        )
+        for config in configs
+    ]
+
+
+class TournamentStats:
+    """Aggregated results, updated as outcomes arrive"""
+    matches: int
+    ticks: int
+    # Wins by side and its policy, e.g. "player (noisy)", so that the
+    # sides of a same-policy match stay apart ("unfinished" for matches
+    # hitting tick limit)
+    wins: Dict[str, int]
+    # Matches played by each worker process
+    matches_per_worker: Dict[int, int]
+
+    def __init__(self):
+        self.matches = 0
+        self.ticks = 0
+        self.wins = {}
+        self.matches_per_worker = {}
+
+    def add(self, outcome: MatchOutcome) -> None:
+        self.matches += 1
+        self.ticks += outcome.result.ticks
+        if outcome.result.winner == 1:
+            winner = "player ({})".format(outcome.config.player_policy)
+        elif outcome.result.winner == 2:
+            winner = "enemy ({})".format(outcome.config.enemy_policy)
+        else:
+            winner = 'unfinished'
+        self.wins[winner] = self.wins.get(winner, 0) + 1
+        self.matches_per_worker[outcome.worker_pid] = (
+            self.matches_per_worker.get(outcome.worker_pid, 0) + 1
+        )
+
+
+class Tournament:
+    """
+    Spreads independent headless matches over a pool of processes.
+    Configs are split into shards (several matches per task) so that
+    the cost of sending a task is spread over many matches, and every
+    worker keeps its interpreter and warm engines between shards.
+    """
+    workers: int
+    shard_size: int
+
+    def __init__(
+        self,
+        workers: int = None,
+        shard_size: int = library.constants.TOURNAMENT_SHARD_SIZE
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+
+    def shards(
+        self,
+        configs: Iterable[MatchConfig]
+    ) -> Iterator[List[MatchConfig]]:
+        shard = []
+        for config in configs:
+            shard.append(config)
+            if len(shard) == self.shard_size:
+                yield shard
+                shard = []
+        if shard:
+            yield shard
+
+    def stream(
+        self,
+        configs: Iterable[MatchConfig]
+    ) -> Iterator[MatchOutcome]:
+        """
+        Plays all matches and yields their outcomes as soon as each
+        shard is finished (not in the order of configs).
+        """
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=warm_up_worker
+        ) as executor:
+            futures = [
+                executor.submit(play_shard, shard)
+                for shard in self.shards(configs)
+            ]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def run(self, configs: Iterable[MatchConfig]) -> TournamentStats:
+        stats = TournamentStats()
+        for outcome in self.stream(configs):
+            stats.add(outcome)
+        return stats
+
+
+class ScalingPoint(NamedTuple):
+    workers: int
+    seconds: float
+    ticks_per_second: float
+    # Speedup over a single worker divided by the number of workers
+    efficiency: float
+
+
+def scaling_benchmark(
+    configs: List[MatchConfig],
+    worker_counts: List[int],
+    shard_size: int = library.constants.TOURNAMENT_SHARD_SIZE
+) -> List[ScalingPoint]:
+    """
+    Plays the same configs with each number of workers.  The first count
+    is taken as the baseline of efficiency, so it should be 1.
+    """
+    points = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        stats = Tournament(workers, shard_size).run(configs)
+        seconds = time.perf_counter() - start
+        if baseline is None:
+            baseline = seconds * worker_counts[0]
+        points.append(ScalingPoint(
+            workers,
+            seconds,
+            stats.ticks / seconds,
+            baseline / (seconds * workers)
+        ))
+    return points
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Play headless matches on all cores"
+    )
+    parser.add_argument('--matches', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the first match")
+    parser.add_argument('--player', default='noisy',
+                        choices=server.headlessEngine.POLICIES)
+    parser.add_argument('--enemy', default='noisy',
+                        choices=server.headlessEngine.POLICIES)
+    parser.add_argument('--field-size', type=float, nargs=2,
+                        default=library.constants.GAME_FIELD_SIZE)
+    parser.add_argument('--score-limit', type=int,
+                        default=library.constants.HEADLESS_SCORE_LIMIT)
+    parser.add_argument('--max-ticks', type=int,
+                        default=library.constants.HEADLESS_MAX_TICKS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard-size', type=int,
+                        default=library.constants.TOURNAMENT_SHARD_SIZE)
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Measure scaling with 1 to --workers processes")
+    args = parser.parse_args(argv)
+
+    configs = [
+        MatchConfig(
+            seed,
+            args.player,
+            args.enemy,
+            tuple(args.field_size),
+            args.score_limit,
+            args.max_ticks
+        )
+        for seed in range(args.seed, args.seed + args.matches)
+    ]
+
+    if args.benchmark:
+        max_workers = args.workers or os.cpu_count() or 1
+        worker_counts = sorted({1, max_workers} | {
+            count for count in (2, 4, 8, 16, 32, 64) if count < max_workers
+        })
+        print("workers  seconds  ticks/s  efficiency")
+        for point in scaling_benchmark(configs, worker_counts, args.shard_size):
+            print("{:7d}  {:7.2f}  {:7.0f}  {:10.2f}".format(*point))
+        return
+
+    tournament = Tournament(args.workers, args.shard_size)
+    stats = TournamentStats()
+    for outcome in tournament.stream(configs):
+        stats.add(outcome)
+        print("Seed {}: {}:{} in {} ticks".format(
+            outcome.config.seed,
+            outcome.result.player_score,
+            outcome.result.enemy_score,
+            outcome.result.ticks
+        ))
+    print("{} matches, {} ticks, wins: {}".format(
+        stats.matches,
+        stats.ticks,
+        stats.wins
+    ))
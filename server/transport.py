@@ -0,0 +1,110 @@
+from typing import Callable, List, Tuple
+import asyncio
+import socket
+
+
+Address = Tuple[str, int]
+
+
+class DatagramServer(asyncio.DatagramProtocol):
+    """
+    UDP endpoint of the server.  Runs on the server's event loop and
+    hands each received datagram to `handler` right away, so no thread
+    has to block in `recvfrom`.
+
+    Datagrams of a tick's broadcasts are queued with `queue` and sent
+    together by `flush`.
+    """
+    handler: Callable[[bytes, Address], None]
+    transport: asyncio.DatagramTransport
+    # The transport's socket, `flush` writes to it directly
+    sock: socket.socket
+    # Datagrams waiting for `flush`
+    pending: List[Tuple[bytes, Address]]
+
+    def __init__(
+        self,
+        handler: Callable[[bytes, Address], None],
+        sock: socket.socket = None
+    ):
+        self.handler = handler
+        self.transport = None
+        self.sock = sock
+        self.pending = []
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Address) -> None:
+        self.handler(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors (e.g. a client went away), UDP has no connection
+        # to close, so only report it
+        print("Transport error: {}".format(exc))
+
+    def sendto(self, data: bytes, addr: Address) -> int:
+        self.transport.sendto(data, addr)
+        return len(data)
+
+    def queue(self, data: bytes, addr: Address) -> None:
+        self.pending.append((data, addr))
+
+    def flush(self) -> Tuple[int, int]:
+        """
+        Sends the queued datagrams in one pass straight on the socket,
+        without the transport's bookkeeping for each of them.  Once the
+        socket's buffer is full, the rest is handed to the transport,
+        which sends it when the socket is writable again.
+        @returns Number of send calls made and of bytes sent
+        """
+        pending = self.pending
+        if not pending:
+            return (0, 0)
+        sent_bytes = 0
+        index = 0
+        if self.sock is not None and self.transport.get_write_buffer_size() == 0:
+            # Keep the order, so nothing can be sent directly while
+            # the transport still has datagrams buffered
+            sendto = self.sock.sendto
+            for (data, addr) in pending:
+                try:
+                    sent_bytes += sendto(data, addr)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError as exc:
+                    self.error_received(exc)
+                index += 1
+        calls = index
+        for (data, addr) in pending[index:]:
+            self.transport.sendto(data, addr)
+            sent_bytes += len(data)
+            calls += 1
+        pending.clear()
+        return (calls, sent_bytes)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def open_server(
+    handler: Callable[[bytes, Address], None],
+    local_addr: Address
+) -> DatagramServer:
+    """Binds the endpoint on the running event loop"""
+    loop = asyncio.get_running_loop()
+    # Created here rather than by the loop, so that the endpoint has the
+    # socket itself and not only the transport's restricted view of it
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.bind(local_addr)
+        (_, protocol) = await loop.create_datagram_endpoint(
+            lambda: DatagramServer(handler, sock),
+            sock=sock
+        )
+    except BaseException:
+        sock.close()
+        raise
+    return protocol